@@ -46,7 +46,14 @@ statement
     | 'LET' (identifier)+ ':' type nl
     | 'IF' comparison 'THEN' nl statement* ('ELSIF' comparison 'THEN' nl statement*)* ('ELSE' nl statement*)? 'END' nl
     | 'WHILE' comparison 'REPEAT' nl statement* 'END' nl
+    // Bound and step are evaluated once; a negative step counts down to the bound
     | 'FOR' identifier ':=' expression 'TO' expression 'BY' expression 'DO' nl statement* 'END' nl
+    // Iterations must be independent and do no I/O; runs on OpenMP with gcc/clang, serially otherwise
+    | 'PARALLEL' 'FOR' identifier ':=' expression 'TO' expression 'BY' number
+          ('REDUCE' ('+' | '*' | 'min' | 'max') identifier)* 'DO' nl statement* 'END' nl
+    // Top level only; a SUB can be called after its definition, it shares all variables
+    | 'SUB' identifier nl statement* 'END' nl
+    | 'CALL' identifier nl
     ;
 
 comparison
@@ -54,11 +61,11 @@ comparison
     ;
 
 expression
-    : term (( '-' | '+' | '%' ) term)*
+    : term (( '-' | '+' ) term)*
     ;
 
 term
-    : unary (( '/' | '*' ) unary)*
+    : unary (( '/' | '*' | '%' ) unary)*
     ;
 
 unary
@@ -82,7 +89,7 @@ identifier
     ;
 
 string
-    : '"' .+ '"'
+    : '"' ~('"' | '\n')* '"'
     ;
 
 type
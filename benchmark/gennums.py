@@ -0,0 +1,10 @@
+# Writes the input file for the sum benchmark: a count followed by that many integers
+import random, sys
+
+count: int = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+random.seed(2022)
+with open("nums.txt", "w") as numfile:
+    numfile.write(f"{count}\n")
+    for start in range(0, count, 10000):
+        chunk: int = min(10000, count - start)
+        numfile.write("\n".join(str(random.randint(-1000, 1000)) for _ in range(chunk)) + "\n")
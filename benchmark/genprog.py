@@ -0,0 +1,51 @@
+# Synthetic Calci program generator for the compiler scaling checks
+#
+#   python genprog.py SHAPE STATEMENTS > prog.ca
+#
+# Shapes: lets (many LET/VAR statements), elsif (one long IF/ELSIF chain),
+# nested (IF/WHILE/FOR blocks nested DEPTH levels deep) and mixed.
+import sys
+
+DEPTH: int = 20
+
+def lets(count: int, pre: str = "") -> list:
+    lines: list = []
+    for i in range(count // 2):
+        lines.append(f"let {pre}v{i}: int")
+        lines.append(f"var {pre}v{i} := {i} * 3 + {i % 7}")
+    return lines
+
+def elsif(count: int, pre: str = "") -> list:
+    lines: list = [f"let {pre}s {pre}n: int", f"var {pre}s := 7", f"var {pre}n := 0"]
+    for i in range(max(1, count // 2)):
+        lines.append(("if" if i == 0 else "elsif") + f" {pre}s = {i} then")
+        lines.append(f"var {pre}n := {pre}n + {i}")
+    lines.append("end")
+    return lines
+
+def nested(count: int, pre: str = "") -> list:
+    lines: list = [f"let {pre}i {pre}n: int", f"var {pre}n := 0"]
+    while len(lines) < count:
+        for depth in range(DEPTH):
+            lines.append([f"if {pre}n > {depth} then",
+                          f"while {pre}n < 0 repeat",
+                          f"for {pre}i := 0 to {pre}n by 1 do"][depth % 3])
+            lines.append(f"var {pre}n := {pre}n + {depth}")
+        lines.extend(["end"] * DEPTH)
+    return lines
+
+def mixed(count: int, pre: str = "") -> list:
+    return lets(count // 3, pre + "a") + elsif(count // 3, pre + "b") + nested(count // 3, pre + "c")
+
+SHAPES: dict = {
+    "lets": lets,
+    "elsif": elsif,
+    "nested": nested,
+    "mixed": mixed
+}
+
+def generate(shape: str, count: int) -> str:
+    return "\n".join(SHAPES[shape](count)) + "\n"
+
+if __name__ == "__main__":
+    sys.stdout.write(generate(sys.argv[1], int(sys.argv[2])))
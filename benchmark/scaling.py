@@ -0,0 +1,81 @@
+# Compiler scaling check
+#
+#   python scaling.py [--sizes 10000 100000 1000000] [--shapes lets elsif ...]
+#
+# Transpiles generated programs (see genprog.py) of increasing size, through
+# the partial evaluator as calci does by default, fits the growth exponent of
+# the transpile time against the source size and fails when it, or the peak
+# memory per source statement, goes over the limits below.
+import argparse, gc, math, os, sys, tempfile, time, tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from genprog import SHAPES, generate
+from calci.lex import Lexer
+from calci.parse import Parser
+from calci.partial import PartialEvaluator
+from calci.lower import Lowering
+from calci.codegen import CodeGen
+from calci.emit import Emitter
+
+MAX_EXPONENT: float = 1.2     # Fitted exponent of time against source size
+MAX_BYTES: int = 4096         # Peak traced memory per source statement
+REPEAT: int = 3
+
+def transpile(progsrc: str, cfname: str) -> None:
+    emitter: Emitter = Emitter(cfname)
+    program = PartialEvaluator(Parser(Lexer(progsrc)).program()).run()
+    CodeGen(emitter).program(Lowering(program, "tcc").run())
+    emitter.writeFile()
+
+def timeit(progsrc: str, cfname: str) -> float:
+    best: float = math.inf
+    for _ in range(REPEAT):
+        gc.collect()
+        start: float = time.perf_counter()
+        transpile(progsrc, cfname)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def peakMemory(progsrc: str, cfname: str) -> int:
+    tracemalloc.start()
+    transpile(progsrc, cfname)
+    peak: int = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak
+
+# Least squares slope of log(time) against log(size)
+def exponent(sizes: list, times: list) -> float:
+    xs: list = [math.log(size) for size in sizes]
+    ys: list = [math.log(max(t, 1e-9)) for t in times]
+    mx: float = sum(xs) / len(xs)
+    my: float = sum(ys) / len(ys)
+    return sum((x - mx) * (y - my) for x, y in zip(xs, ys)) / sum((x - mx) ** 2 for x in xs)
+
+def main() -> int:
+    arg_parser: argparse.ArgumentParser = argparse.ArgumentParser(description="Calci compiler scaling check")
+    arg_parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 30000, 100000])
+    arg_parser.add_argument("--shapes", nargs="+", default=list(SHAPES), choices=list(SHAPES))
+    args: argparse.Namespace = arg_parser.parse_args()
+
+    sys.setrecursionlimit(10000)
+    failed: bool = False
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cfname: str = os.path.join(tmpdir, "prog.c")
+        for shape in args.shapes:
+            sources: list = [generate(shape, size) for size in args.sizes]
+            counts: list = [progsrc.count("\n") for progsrc in sources]
+            times: list = [timeit(progsrc, cfname) for progsrc in sources]
+            for count, progsrc, elapsed in zip(counts, sources, times):
+                print(f"{shape:>8} {count:>9} statements {len(progsrc):>10} chars {elapsed:9.3f}s")
+
+            slope: float = exponent([len(progsrc) for progsrc in sources], times)
+            perstmt: float = peakMemory(sources[-1], cfname) / counts[-1]
+            ok: bool = slope <= MAX_EXPONENT and perstmt <= MAX_BYTES
+            failed = failed or not ok
+            print(f"{shape:>8} exponent {slope:.2f} (max {MAX_EXPONENT}), "
+                  f"peak {perstmt:.0f} B/statement (max {MAX_BYTES}) {'ok' if ok else 'FAIL'}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,12 @@
+#include <stdio.h>
+
+int main() {
+    unsigned int n, i;
+    int x, total = 0;
+    scanf("%d", &n);
+    for (i = 0; i < n; i++){
+        scanf("%d", &x);
+        total += x;
+    }
+    printf("%d\n", total);
+}
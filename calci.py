@@ -31,46 +31,85 @@
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
 # Python imports
-import tempfile
+import os, tempfile
 
 # Language imports
 from calci.lex import Lexer
+from calci.parlex import makeLexer
 from calci.parse import Parser
+from calci.nodes import Program
 from calci.emit import Emitter
+from calci.lower import Lowering
+from calci.partial import PartialEvaluator
+from calci.codegen import CodeGen
 from calci.cmdargs import argparse, arg_parser
 from calci.fileutils import readFile, dlfName
-from calci.tools import runProgram, clearTemp
+from calci.tools import runProgram, clearTemp, getCC
+from calci.profiler import profileProgram
+from calci.batch import runBatch
+from calci.pgo import pgoBuild
 
 class Calci:
-    def transpile(self, fname: str, dlang: str, forcomp: bool = False) -> tempfile._TemporaryFileWrapper:
+    def transpile(self, fname: str, dlang: str, forcomp: bool = False, lines: bool = False,
+                  jobs: int = None, partial: bool = True) -> tempfile._TemporaryFileWrapper:
         progsrc: str = readFile(fname)
-        lexer: Lexer = Lexer(progsrc)
+        lexer: Lexer = makeLexer(progsrc, jobs)
 
         tempf: tempfile._TemporaryFileWrapper = tempfile.NamedTemporaryFile()
 
         if dlang == "java":
             pass
         else:
-            emitter: Emitter = Emitter(dlfName(tempf.name, "c")) if forcomp else Emitter(dlfName(fname, "c"))
-            parser: Parser = Parser(lexer, emitter)
+            cfname: str = dlfName(tempf.name, "c") if forcomp else dlfName(fname, "c")
+            emitter: Emitter = Emitter(cfname, fname if lines else None)
+            parser: Parser = Parser(lexer)
 
-            parser.program()
+            program: Program = parser.program()
+            if partial:
+                program = PartialEvaluator(program).run()
+            program = Lowering(program, getCC()).run()
+            CodeGen(emitter).program(program)
             emitter.writeFile()
         
         return tempf
 
 
-    def compile(self, fname: str, dlang: str) -> None:
-        tempf: tempfile._TemporaryFileWrapper = self.transpile(fname, dlang, forcomp=True)
-        runProgram(tempf.name, dlang)
+    def compile(self, fname: str, dlang: str, lines: bool = False, jobs: int = None, pgo: str = None,
+                partial: bool = True) -> None:
+        tempf: tempfile._TemporaryFileWrapper = self.transpile(fname, dlang, forcomp=True, lines=lines, jobs=jobs,
+                                                               partial=partial)
+        if pgo is not None and dlang != "java":
+            exe: str = dlfName(tempf.name) + (".exe" if os.name == 'nt' else "")
+            pgoBuild(getCC(), dlfName(tempf.name, "c"), exe, pgo)
+        else:
+            runProgram(tempf.name, dlang)
         clearTemp(tempf, fname)
 
+    def profile(self, fname: str, dlang: str) -> None:
+        tempf: tempfile._TemporaryFileWrapper = self.transpile(fname, dlang, forcomp=True, lines=True, partial=False)
+        cfname: str = dlfName(tempf.name, "c")
+        profileProgram(cfname, fname, readFile(fname).splitlines())
+        os.remove(cfname)
+
+    def batch(self, fname: str, dlang: str, inputs: list, jobs: int = None, output: str = None,
+              pgo: str = None, partial: bool = True) -> None:
+        self.compile(fname, dlang, pgo=pgo, partial=partial)
+        exe: str = dlfName(fname) + (".exe" if os.name == 'nt' else "")
+        runBatch(exe, inputs, jobs, output or dlfName(fname) + ".results.json")
+
     def run(self) -> None:
         args: argparse.ArgumentParser = arg_parser.parse_args()
-        if args.source:
-            self.transpile(args.File, args.lang)
+        if args.inputs and args.command != "batch":
+            arg_parser.error("input files are only taken by batch")
+        if args.command == "profile":
+            self.profile(args.File, args.lang)
+        elif args.command == "batch":
+            self.batch(args.File, args.lang, args.inputs, args.jobs, args.output, args.pgo, not args.no_partial)
+        elif args.source:
+            self.transpile(args.File, args.lang, lines=args.lines, jobs=args.jobs, partial=not args.no_partial)
         else:
-            self.compile(args.File, args.lang)
+            self.compile(args.File, args.lang, lines=args.lines, jobs=args.jobs, pgo=args.pgo,
+                         partial=not args.no_partial)
 
 if __name__ == "__main__":
     calci = Calci()
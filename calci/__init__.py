@@ -1,3 +1,5 @@
 __version__: int = 1.0
 __author__: str = "M.V.Harish Kumar"
-__ver_str__: str = f"This is Calci programming language v{__version__} Created by {__author__}."
\ No newline at end of file
+__ver_str__: str = f"This is Calci programming language v{__version__} Created by {__author__}."
+
+from .formula import compile_formula, FormulaError
@@ -0,0 +1,176 @@
+# The Calci Programming language batch runner
+#
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Runs one compiled program over many input files from a pool of worker
+# threads, each feeding an input to its own process through pipes, and
+# saves outputs, exit codes and timings of every run as JSON.
+
+import json, os, subprocess, sys, tempfile, threading, time
+from concurrent.futures import ThreadPoolExecutor
+from .fileutils import checkIfFile
+from . import tools
+
+# Starts each run and reports how it went. A process forked from Python starts
+# with a peak memory of all of Python's, which wait4 would report for the
+# program too, so the program is forked from this small one instead.
+RUNNER: str = r"""#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+#include <sys/resource.h>
+#include <sys/wait.h>
+
+/* Runs argv[2] on the standard streams of this process, then writes its wait
+   status, user and system CPU seconds and peak RSS to descriptor argv[1] */
+int main(int argc, char **argv){
+    struct rusage usage;
+    int status, fd;
+    pid_t pid;
+    FILE *report;
+    if(argc < 3) return 2;
+    fd = atoi(argv[1]);
+    pid = fork();
+    if(pid < 0) return 2;
+    if(pid == 0){
+        close(fd);
+        execv(argv[2], argv + 2);
+        _exit(127);
+    }
+    close(0);
+    close(1);
+    close(2);
+    if(wait4(pid, &status, 0, &usage) < 0) return 2;
+    report = fdopen(fd, "w");
+    if(!report) return 2;
+    fprintf(report, "%d %ld.%06ld %ld.%06ld %ld\n", status,
+            (long)usage.ru_utime.tv_sec, (long)usage.ru_utime.tv_usec,
+            (long)usage.ru_stime.tv_sec, (long)usage.ru_stime.tv_usec, (long)usage.ru_maxrss);
+    return fclose(report) != 0;
+}
+"""
+
+# Builds the runner in `workdir`, None where it can't be built
+def buildRunner(workdir: str) -> str:
+    if os.name == "nt":
+        return None
+    src: str = os.path.join(workdir, "runner.c")
+    runner: str = os.path.join(workdir, "runner")
+    with open(src, "w") as srcfile:
+        srcfile.write(RUNNER)
+    result = subprocess.run(f"{tools.getCC()} {src} -o {runner}", shell=True,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return runner if result.returncode == 0 else None
+
+# Feeds the input to a process and collects its output like communicate().
+# Started through the runner, the CPU time and peak memory of the run come
+# back through a pipe.
+def runInput(exe: str, path: str, runner: str = None) -> dict:
+    with open(path, "rb") as inputFile:
+        data: bytes = inputFile.read()
+
+    start: float = time.perf_counter()
+    if runner is not None:
+        reportRead, reportWrite = os.pipe()
+        proc: subprocess.Popen = subprocess.Popen([runner, str(reportWrite), exe], pass_fds=(reportWrite,),
+                                                  stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                                  stderr=subprocess.PIPE)
+        os.close(reportWrite)
+    else:
+        proc: subprocess.Popen = subprocess.Popen([exe], stdin=subprocess.PIPE,
+                                                  stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    errors: list = []
+
+    def feed() -> None:
+        try:
+            proc.stdin.write(data)
+        except BrokenPipeError:       # The program stopped reading early
+            pass
+        try:
+            proc.stdin.close()
+        except BrokenPipeError:       # Flushing what was left of the input
+            pass
+
+    def drain() -> None:
+        errors.append(proc.stderr.read())
+
+    threads: list = [threading.Thread(target=feed), threading.Thread(target=drain)]
+    for thread in threads:
+        thread.start()
+    output: bytes = proc.stdout.read()
+    for thread in threads:
+        thread.join()
+
+    cpu: float = None
+    maxrss: int = None
+    proc.wait()
+    if runner is not None:
+        with os.fdopen(reportRead) as reportFile:
+            report: list = reportFile.read().split()
+        if proc.returncode == 0 and len(report) == 4:
+            status: int = int(report[0])
+            proc.returncode = os.WEXITSTATUS(status) if os.WIFEXITED(status) else -os.WTERMSIG(status)
+            cpu = float(report[1]) + float(report[2])
+            maxrss = int(report[3])
+            if sys.platform == "darwin":
+                maxrss //= 1024       # Bytes there, KiB on Linux
+    wall: float = time.perf_counter() - start
+    proc.stdout.close()
+    proc.stderr.close()
+
+    return {
+        "input": path,
+        "exit_code": proc.returncode,
+        "wall_s": round(wall, 6),
+        "cpu_s": None if cpu is None else round(cpu, 6),
+        "max_rss_kib": maxrss,
+        "stdout": output.decode(errors="replace"),
+        "stderr": errors[0].decode(errors="replace"),
+    }
+
+def runBatch(exe: str, inputs: list, jobs: int, resultsName: str) -> None:
+    for path in inputs:
+        checkIfFile(path)
+    exe = os.path.abspath(exe)
+    workers: int = jobs or os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as workdir:
+        runner: str = buildRunner(workdir)
+        start: float = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results: list = list(pool.map(lambda path: runInput(exe, path, runner), inputs))
+        wall: float = time.perf_counter() - start
+
+    with open(resultsName, "w") as resultsFile:
+        json.dump({"program": exe, "workers": workers, "wall_s": round(wall, 6), "runs": results},
+                  resultsFile, indent=1)
+
+    failed: int = sum(1 for result in results if result["exit_code"] != 0)
+    print(f"Ran {len(results)} inputs on {workers} workers in {wall:.2f}s, {failed} failed; results in {resultsName}")
@@ -36,11 +36,21 @@ from . import __ver_str__
 arg_parser: argparse.ArgumentParser = argparse.ArgumentParser(prog="calci",
                                     description="The Calci programming language compiler")
 
+arg_parser.add_argument('command',
+                        nargs='?',
+                        choices=["profile", "batch"],
+                        help="profile: build with profiling, run and report time per source line; "
+                             "batch: build once and run on every input file")
+
 arg_parser.add_argument('File',
                         metavar='file',
                         type=str,
                         help="The File to compile")
 
+arg_parser.add_argument('inputs',
+                        nargs='*',
+                        help="input files to run the program on (batch)")
+
 arg_parser.add_argument("-l",
                         "--lang",
                         action="store",
@@ -52,6 +62,34 @@ arg_parser.add_argument("-S",
                         action="store_true",
                         help="only Compiles Calci File to Given Language")
 
+arg_parser.add_argument("-g",
+                        "--lines",
+                        action="store_true",
+                        help="emits #line directives mapping C code to source lines")
+
+arg_parser.add_argument("-j",
+                        "--jobs",
+                        action="store",
+                        type=int,
+                        help="processes lexing the source, or runs at a time with batch "
+                             "(0: all cores, default: all cores for sources over 1 MiB, all cores for batch)")
+
+arg_parser.add_argument("--pgo",
+                        action="store",
+                        type=str,
+                        metavar="TRAINING_INPUT",
+                        help="builds with gcc/clang profile-guided optimization, trained by running on this input")
+
+arg_parser.add_argument("--no-partial",
+                        action="store_true",
+                        help="doesn't run the part of the program before its first INPUT at compile time")
+
+arg_parser.add_argument("-o",
+                        "--output",
+                        action="store",
+                        type=str,
+                        help="results file of batch (default: <file>.results.json)")
+
 arg_parser.add_argument("-v",
                         "--version",
                         action="version",
@@ -0,0 +1,200 @@
+# The Calci Programming language C code generator
+#
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from . import tools
+from . import nodes
+from .emit import Emitter
+
+# Binding strength of C operators, used to parenthesize only where needed
+PRECEDENCE: dict = {
+    "*": 3, "/": 3, "%": 3,
+    "+": 2, "-": 2,
+}
+UNARY_PRECEDENCE: int = 4
+
+class CodeGen:
+    def __init__(self, emitter: Emitter) -> None:
+        self.emitter: Emitter = emitter
+        self.globals: bool = False    # Whether variables live at file scope
+
+    def program(self, program: nodes.Program) -> None:
+        # SUBs that stay functions share the variables with main
+        self.begin(any(isinstance(stmt, nodes.Sub) for stmt in program.body))
+        self.body(program.body)
+        self.end()
+
+    def begin(self, shared: bool) -> None:
+        self.globals = shared
+        self.emitter.headerLine("#include <stdio.h>")
+        if self.globals:
+            self.emitter.emitLine("int main(void){")
+        else:
+            self.emitter.headerLine("int main(void){")
+
+    def end(self) -> None:
+        self.emitter.flushText()
+        if "output" in self.emitter.runtimes:
+            self.emitter.emitLine("calci_flush();")
+        self.emitter.emitLine("return 0;")
+        self.emitter.emitLine("}")
+
+    def body(self, body: list) -> None:
+        line: int = self.emitter.line
+        for stmt in body:
+            self.statement(stmt)
+        self.emitter.markLine(line)   # The code closing the body belongs to the statement around it
+
+    def statement(self, stmt: nodes.Node) -> None:
+        if stmt.lineno and not isinstance(stmt, (nodes.Let, nodes.Sub)):
+            self.emitter.markLine(stmt.lineno)
+
+        if isinstance(stmt, nodes.PrintText):
+            self.emitter.emitText(stmt.text)
+            if stmt.newline:
+                self.emitter.emitText("\\n")
+
+        elif isinstance(stmt, nodes.Print):
+            self.emitter.useRuntime("output")
+            self.emitter.emitLine(f"{tools.genPrintFn(stmt.vtype)}({self.expression(stmt.value)});")
+            if stmt.newline:
+                self.emitter.emitText("\\n")
+
+        elif isinstance(stmt, nodes.FmtPrint):
+            self.emitter.useRuntime("output")
+            args: str = "".join(f", {name}" for name in stmt.names)
+            self.emitter.emitLine(f"calci_fmt(\"{stmt.fmt}\"{args});")
+
+        elif isinstance(stmt, nodes.Input):
+            self.emitter.useRuntime("input")
+            arg: str = stmt.name if stmt.vtype == "str" else "&" + stmt.name
+            self.emitter.emitLine(f"{tools.genInputFn(stmt.vtype)}({arg});")
+
+        elif isinstance(stmt, nodes.Assign):
+            self.emitter.emitLine(self.assignment(stmt) + ";")
+
+        elif isinstance(stmt, nodes.Let):
+            storage: str = "static " if self.globals else ""
+            self.emitter.headerLine(f"{storage}{tools.getcType(stmt.vtype)} {','.join(stmt.names)};")
+
+        elif isinstance(stmt, nodes.Sub):
+            self.emitter.beginFunction()
+            self.emitter.emitLine(f"static void calci_sub_{stmt.name}(void){{")
+            self.body(stmt.body)
+            self.emitter.emitLine("}")
+            self.emitter.endFunction()
+
+        elif isinstance(stmt, nodes.Call):
+            self.emitter.emitLine(f"calci_sub_{stmt.name}();")
+
+        elif isinstance(stmt, nodes.If):
+            for index, (cond, body) in enumerate(stmt.arms):
+                self.emitter.emitLine(("if(" if index == 0 else "}else if(") + self.expression(cond) + "){")
+                self.body(body)
+            if stmt.orelse is not None:
+                self.emitter.emitLine("} else {")
+                self.body(stmt.orelse)
+            self.emitter.emitLine("}")
+
+        elif isinstance(stmt, nodes.While):
+            self.emitter.emitLine(f"while({self.expression(stmt.cond)}){{")
+            self.body(stmt.body)
+            self.emitter.emitLine("}")
+
+        elif isinstance(stmt, nodes.Switch):
+            self.emitter.emitLine(f"switch({self.expression(stmt.subject)}){{")
+            for value, body in stmt.cases:
+                self.emitter.emitLine(f"case {value}:")
+                self.body(body)
+                self.emitter.emitLine("break;")
+            if stmt.default is not None:
+                self.emitter.emitLine("default:")
+                self.body(stmt.default)
+                self.emitter.emitLine("break;")
+            self.emitter.emitLine("}")
+
+        elif isinstance(stmt, nodes.Block):
+            self.emitter.emitLine("{")
+            for ctype, name in stmt.decls:
+                self.emitter.emitLine(f"{ctype} {name};")
+            self.body(stmt.body)
+            self.emitter.emitLine("}")
+
+        elif isinstance(stmt, nodes.Loop):
+            for pragma in stmt.pragmas:
+                self.emitter.emitLine(f"#pragma {pragma}")
+            init: str = self.assignment(stmt.init) if stmt.init is not None else ""
+            self.emitter.emitLine(f"for({init}; {self.expression(stmt.cond)}; {self.assignment(stmt.update)}){{")
+            self.body(stmt.body)
+            self.emitter.emitLine("}")
+
+        else:
+            raise TypeError(f"Cannot generate code for {type(stmt).__name__}")
+
+    # C assignment without the semicolon, using ++/+=/-= where they fit
+    def assignment(self, stmt: nodes.Assign) -> str:
+        value: nodes.Node = stmt.value
+        if isinstance(value, nodes.BinOp) and value.op in ["+", "-"] and \
+           isinstance(value.left, nodes.Ident) and value.left.name == stmt.name:
+            if isinstance(value.right, nodes.Number) and value.right.text == "1":
+                return stmt.name + value.op * 2
+            return f"{stmt.name}{value.op}={self.expression(value.right)}"
+        return f"{stmt.name} = {self.expression(value)}"
+
+    def expression(self, expr: nodes.Node, prec: int = 0) -> str:
+        if isinstance(expr, nodes.Number):
+            return expr.text
+
+        if isinstance(expr, nodes.Ident):
+            return expr.name
+
+        if isinstance(expr, nodes.UnaryOp):
+            return expr.op + self.expression(expr.operand, UNARY_PRECEDENCE)
+
+        if isinstance(expr, nodes.BinOp):
+            opprec: int = PRECEDENCE[expr.op]
+            left: str = self.expression(expr.left, opprec)
+            right: str = self.expression(expr.right, opprec + 1)
+            if right[0] == expr.op:
+                right = " " + right       # a - -b must not become a--b
+            code: str = left + expr.op + right
+            return f"({code})" if opprec < prec else code
+
+        if isinstance(expr, nodes.Compare):
+            code: str = self.expression(expr.first, 1)
+            for op, operand in expr.rest:
+                code += op + self.expression(operand, 1)
+            return f"({code})" if prec > 0 else code
+
+        if isinstance(expr, nodes.Select):
+            return f"({self.expression(expr.cond)} ? {self.expression(expr.then)} : {self.expression(expr.orelse)})"
+
+        raise TypeError(f"Cannot generate code for {type(expr).__name__}")
@@ -30,21 +30,107 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+from .runtime import RUNTIMES, REQUIRES
+
+MAX_LITERAL: int = 4000       # Merged literal output is written in pieces of about this size
+C_LINE: str = "#line C"       # Placeholder for a #line back to the C file, numbered in source()
+
+# A path as a C string literal
+def cString(path: str) -> str:
+    return '"' + path.replace("\\", "\\\\").replace('"', '\\"') + '"'
+
 class Emitter:
-    def __init__(self, fullpath: str) -> None:
+    def __init__(self, fullpath: str, linefile: str = None) -> None:
         self.fullPath: str = fullpath
-        self.header: str = ""
-        self.code: str = ""
+        self.lineFile: str = linefile     # Source named in #line directives, None for no directives
+        self.line: int = 0            # Calci line the code being emitted belongs to, 0 for none
+        self.nextLine: int = -1       # Line the next C line counts as, -1 for the C file, None if not known
+        self.mainLine: int = 0
+        self.runtime: str = ""
+        self.runtimes: set = set()    # Runtime chunks included so far.
+        self.header: list = []        # Output pieces, joined once in writeFile
+        self.code: list = []
+        self.functions: list = []     # Code of the functions before main
+        self.mainCode: list = None    # Code of main while a function is being emitted
+        self.text: list = []          # Literal output waiting to be written.
+        self.textLen: int = 0
 
     def emit(self, code: str) -> None:
-        self.code += code
+        self.flushText()
+        self.code.append(code)
     
     def emitLine(self, code: str) -> None:
-        self.code += code + '\n'
+        self.flushText()
+        if self.lineFile is not None:
+            if self.line == 0:
+                if self.nextLine != -1:
+                    self.code.append(C_LINE + '\n')
+                    self.nextLine = -1
+            else:
+                if self.nextLine != self.line:
+                    self.code.append(f"#line {self.line} {cString(self.lineFile)}\n")
+                self.nextLine = self.line + 1
+        self.code.append(code + '\n')
     
     def headerLine(self, code: str):
-        self.header += code + '\n'
+        self.header.append(code + '\n')
+
+    # Attributes the code that follows to a line of the Calci source, 0 for
+    # none. Every C line gets the right line, a #line goes wherever counting
+    # on from the last one would be off.
+    def markLine(self, lineno: int) -> None:
+        if self.lineFile is not None and lineno != self.line:
+            self.flushText()
+            self.line = lineno
+
+    # Sends the code that follows to the functions ahead of main, until endFunction
+    def beginFunction(self) -> None:
+        self.flushText()
+        self.mainCode = self.code
+        self.code = self.functions
+        self.mainLine = self.line
+        self.line = 0
+        self.nextLine = None
+
+    def endFunction(self) -> None:
+        self.flushText()
+        self.code = self.mainCode
+        self.mainCode = None
+        self.line = self.mainLine
+        self.nextLine = None
+
+    def useRuntime(self, name: str) -> None:
+        if name not in self.runtimes:
+            for dep in REQUIRES.get(name, []):
+                self.useRuntime(dep)
+            self.runtimes.add(name)
+            self.runtime += RUNTIMES[name]
+
+    # Queues literal output, adjacent literals end up in a single write
+    def emitText(self, text: str) -> None:
+        self.text.append(text.replace("%%", "%"))
+        self.textLen += len(text)
+        if self.textLen > MAX_LITERAL:
+            self.flushText()
+
+    def flushText(self) -> None:
+        if self.textLen:
+            self.useRuntime("output")
+            text: str = "".join(self.text)
+            self.text = []
+            self.textLen = 0
+            self.emitLine(f"calci_lit(\"{text}\");")
+
+    def source(self) -> str:
+        source: str = self.runtime + "".join(self.header) + "".join(self.functions) + "".join(self.code)
+        if self.lineFile is None:
+            return source
+        lines: list = source.split("\n")
+        for index, line in enumerate(lines):
+            if line == C_LINE:
+                lines[index] = f"#line {index + 2} {cString(self.fullPath)}"
+        return "\n".join(lines)
 
     def writeFile(self):
         with open(self.fullPath, 'w') as outputFile:
-            outputFile.write(self.header + self.code)
\ No newline at end of file
+            outputFile.write(self.source())
\ No newline at end of file
@@ -0,0 +1,128 @@
+# The Calci Programming language formula compiler
+#
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Compiles Calci expressions into Python callables, so host programs can use
+# formulas written in Calci without going through C. The callable is built
+# from Python operators only, so it works on plain numbers as well as on
+# whole NumPy arrays, one array operation per operator.
+
+import ast
+from functools import lru_cache
+from . import nodes
+from .lex import Lexer, TokType
+from .parse import Parser
+from .lower import exprType
+
+FORMULA_CACHE_SIZE: int = 256     # Compiled formulas kept around, least recently used dropped first
+
+class FormulaError(Exception):
+    pass
+
+class FormulaLexer(Lexer):
+    def abort(self, message: str) -> None:
+        raise FormulaError(message)
+
+class FormulaParser(Parser):
+    def abort(self, message, lineno: int = None, errname: str = "ParseError") -> None:
+        raise FormulaError(message)
+
+# Integer / and % truncate towards zero as in C, where Python's floor
+def cDiv(a, b):
+    q = a // b
+    return q + ((q < 0) & (q * b != a))
+
+def cMod(a, b):
+    return a - b * cDiv(a, b)
+
+# Names the helpers go by in compiled formulas, which no Calci identifier can clash with
+HELPERS: dict = {"c_div": cDiv, "c_mod": cMod}
+OPERATORS: dict = {"+": ast.Add, "-": ast.Sub, "*": ast.Mult, "/": ast.Div}
+
+# Python expression tree computing a Calci expression
+def pythonExpr(expr: nodes.Node, types: dict) -> ast.expr:
+    if isinstance(expr, nodes.Number):
+        return ast.Constant(float(expr.text) if "." in expr.text else int(expr.text))
+
+    if isinstance(expr, nodes.Ident):
+        return ast.Name(expr.name, ast.Load())
+
+    if isinstance(expr, nodes.UnaryOp):
+        op: ast.unaryop = ast.USub() if expr.op == "-" else ast.UAdd()
+        return ast.UnaryOp(op, pythonExpr(expr.operand, types))
+
+    if isinstance(expr, nodes.BinOp):
+        left: ast.expr = pythonExpr(expr.left, types)
+        right: ast.expr = pythonExpr(expr.right, types)
+        real: bool = exprType(expr, types) == "real"
+        if expr.op == "%":
+            if real:
+                raise FormulaError("% needs integer operands")
+            return ast.Call(ast.Name("c_mod", ast.Load()), [left, right], [])
+        if expr.op == "/" and not real:
+            return ast.Call(ast.Name("c_div", ast.Load()), [left, right], [])
+        return ast.BinOp(left, OPERATORS[expr.op](), right)
+
+    raise TypeError(f"Cannot compile {type(expr).__name__} in a formula")
+
+@lru_cache(maxsize=FORMULA_CACHE_SIZE)
+def compileCached(text: str, typeItems: tuple):
+    types: dict = dict(typeItems)
+    for name, vtype in typeItems:
+        if vtype not in ["nat", "int", "real"]:
+            raise FormulaError(f"Formula variable {name} must be nat, int or real, not {vtype}")
+        if name in ["True", "False", "None"]:
+            raise FormulaError(f"Formula variable {name} can't be a Python argument")
+    if "\n" in text:
+        raise FormulaError("A formula must be a single line")
+
+    parser: FormulaParser = FormulaParser(FormulaLexer(text))
+    parser.vars = types
+    expr: nodes.Node = parser.expression()
+    if not parser.checkToken(TokType.NEWLINE) or not parser.checkPeek(TokType.EOF):
+        raise FormulaError(f"Unexpected token at {parser.curToken.text}")
+
+    args: ast.arguments = ast.arguments(posonlyargs=[], args=[ast.arg(name) for name in types],
+                                        kwonlyargs=[], kw_defaults=[], defaults=[])
+    tree: ast.Expression = ast.Expression(ast.Lambda(args, pythonExpr(expr, types)))
+    ast.fix_missing_locations(tree)
+    formula = eval(compile(tree, f"<formula {text}>", "eval"), HELPERS)
+    formula.__doc__ = text
+    return formula
+
+# Compiles a Calci expression such as "a * b + c % 7" into a Python callable.
+# types maps each variable of the formula to its Calci type (nat, int or real),
+# the callable takes the variables in that order, by position or by name.
+# Results follow Calci's C semantics for division and remainder, while number
+# ranges are those of the arguments (Python numbers or NumPy array dtypes).
+# Repeated compiles of the same formula and types come from a cache.
+def compile_formula(text: str, types: dict = None):
+    return compileCached(text.strip(), tuple((types or {}).items()))
@@ -0,0 +1,314 @@
+# The Calci Programming language incremental front end
+#
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Keeps a source being edited compiled. Tokens are cached per line and the
+# program is kept as a list of units, each a top-level statement with the
+# blank lines around it, along with the C code generated for it. Statements
+# end at newlines and blocks at END, so an edit re-lexes only the lines it
+# changes and re-parses and regenerates only the top-level statements around
+# them, until parsing meets a unit boundary of the old parse again. Only a
+# change to what a region declares (LETs, SUBs) makes the rest of the source
+# go through the parser again. A statement that fails to parse makes a unit
+# running to the next line where parsing can resume, which depends on the
+# text alone, so the units are always those of parsing the whole source afresh.
+
+import copy
+from bisect import bisect_right
+from . import tools
+from . import nodes
+from .lex import Token, TokType
+from .parlex import ChunkLexer, ChunkError
+from .parse import Parser
+from .lower import Lowering
+from .codegen import CodeGen
+from .emit import Emitter
+
+class SourceError(Exception):
+    def __init__(self, errname: str, message: str, lineno: int) -> None:
+        super().__init__(message)
+        self.errname: str = errname
+        self.message: str = message
+        self.lineno: int = lineno
+
+class UnitParser(Parser):
+    def abort(self, message, lineno: int = None, errname: str = "ParseError") -> None:
+        raise SourceError(errname, message, lineno or self.lexer.lineno)
+
+# Tokens of one source line, ending with its NEWLINE, and the lex error if any
+def lexLine(line: str) -> tuple:
+    lexer: ChunkLexer = ChunkLexer(line)
+    tokens: list = []
+    try:
+        while True:
+            token: Token = lexer.getToken()
+            if token.kind == TokType.EOF:
+                break
+            tokens.append(token)
+    except ChunkError as err:
+        return ([Token("\n", TokType.NEWLINE)], err.message)
+    return (tokens, None)
+
+# Serves the cached tokens of the source from a given line on to a Parser in
+# place of a Lexer
+class LineStream:
+    def __init__(self, lines: list, tokens: list, lineno: int) -> None:
+        self.src_lines: list = lines
+        self.tokens: list = tokens
+        self.lineno: int = lineno
+        self.line: int = lineno - 1   # Index of the line being served
+        self.pos: int = 0
+
+    def getToken(self) -> Token:
+        while self.line < len(self.tokens):
+            if self.pos < len(self.tokens[self.line]):
+                self.pos += 1
+                return self.tokens[self.line][self.pos - 1]
+            self.line += 1
+            self.pos = 0
+        return Token('', TokType.EOF)
+
+class Unit:
+    def __init__(self, lines: int, node: nodes.Node = None, error: tuple = None) -> None:
+        self.lines: int = lines       # Source lines covered
+        self.node: nodes.Node = node  # The statement, None for trailing blank lines or a parse error
+        self.error: tuple = error     # (line offset in the unit, error name, message) of a parse error
+        self.vars: dict = {}          # Variables the unit declares, with their types
+        self.scope: tuple = None      # (variables, SUBs) declared before the unit
+        self.header: list = []        # Generated C, as the Emitter lists
+        self.functions: list = []
+        self.code: list = []
+        self.runtimes: set = set()
+
+    # What later units can see of this one
+    def declares(self) -> tuple:
+        sub: nodes.Sub = self.node if isinstance(self.node, nodes.Sub) else None
+        return (self.vars, sub)
+
+class IncrementalCompiler:
+    def __init__(self, text: str = "", cc: str = None) -> None:
+        self.cc: str = cc or tools.getCC()
+        self.lines: list = []         # Source lines, their tokens and lex errors
+        self.tokens: list = []
+        self.lexErrors: list = []
+        self.units: list = []
+        self.starts: list = []        # First line of each unit
+        self.subCount: int = 0        # Units defining a SUB, which put variables at file scope
+        self.setText(text)
+
+    # Takes a new version of the whole source, working out the lines that changed
+    def setText(self, text: str) -> None:
+        lines: list = text.splitlines()
+        size: int = min(len(lines), len(self.lines))
+        prefix: int = 0
+        while prefix < size and lines[prefix] == self.lines[prefix]:
+            prefix += 1
+        suffix: int = 0
+        while suffix < size - prefix and lines[-1 - suffix] == self.lines[-1 - suffix]:
+            suffix += 1
+        if prefix == len(lines) == len(self.lines) and self.units:
+            return
+        self.replaceLines(prefix + 1, len(self.lines) - suffix, lines[prefix:len(lines) - suffix])
+
+    # Replaces source lines first to last (counting from 1, last = first - 1
+    # inserts before first) with the lines of text
+    def edit(self, first: int, last: int, text: str) -> None:
+        self.replaceLines(first, last, text.splitlines())
+
+    def replaceLines(self, first: int, last: int, lines: list) -> None:
+        lexed: list = [lexLine(line) for line in lines]
+        self.lines[first - 1:last] = lines
+        self.tokens[first - 1:last] = [tokens for tokens, _ in lexed]
+        self.lexErrors[first - 1:last] = [error for _, error in lexed]
+        self.reparse(first, first + len(lines) - 1, last)
+
+    def reparse(self, first: int, newLast: int, oldLast: int) -> None:
+        # Start at the unit holding the first changed line, or at the error
+        # before it, whose end depends on the line after it
+        index: int = max(0, bisect_right(self.starts, first) - 1)
+        if index > 0 and self.units[index - 1].error is not None:
+            index -= 1
+        line: int = self.starts[index] if self.units else 1
+        scope: tuple = self.units[index].scope if self.units else ({}, {})
+        vars: dict = dict(scope[0])
+        subs: dict = dict(scope[1])
+        rejoins = self.rejoins(index, oldLast, newLast - oldLast)
+        rejoin: tuple = next(rejoins)
+
+        shared: bool = self.subCount > 0
+        parsed: list = []
+        starts: list = []
+        # Declarations made by the parsed units and by the old units they
+        # replace so far. Once both sides agree, the scope after them is the
+        # same and the old units can be kept. SUBs compare by node, since
+        # callers inline the body
+        newDecls: tuple = ({}, {})
+        oldDecls: tuple = ({}, {})
+        scanned: int = index
+        while True:
+            unit: Unit = self.parseUnit(line, vars, subs)
+            unit.scope = scope
+            if unit.error is not None:
+                unit.lines = self.resumeLine(max(line, line + unit.error[0]) + 1) - line
+            elif unit.declares() != ({}, None):
+                self.declare(unit, vars, subs)
+                self.declare(unit, *newDecls)
+                scope = (dict(vars), dict(subs))
+            self.generate(unit, vars, subs, shared)
+            if unit.lines > 0:
+                parsed.append(unit)
+                starts.append(line)
+            line += unit.lines
+
+            if line > len(self.lines):
+                end: int = len(self.units)
+                break
+            while rejoin[0] < line:
+                rejoin = next(rejoins)
+            start, end = rejoin
+            if start == line and line > newLast:
+                for old in self.units[scanned:end]:
+                    self.declare(old, *oldDecls)
+                scanned = end
+                if newDecls == oldDecls:
+                    break
+
+        replaced: list = self.units[index:end]
+        shift: int = line - (self.starts[end] if end < len(self.units) else line)
+        self.units[index:end] = parsed
+        self.starts[index:end] = starts
+        if shift:
+            tail: int = index + len(parsed)
+            self.starts[tail:] = [start + shift for start in self.starts[tail:]]
+
+        self.subCount += sum(1 for unit in parsed if isinstance(unit.node, nodes.Sub)) - \
+                         sum(1 for unit in replaced if isinstance(unit.node, nodes.Sub))
+        if (self.subCount > 0) != shared:
+            self.regenerate()
+
+    # First line from the given one on where parsing can pick up after an
+    # error: one that isn't indented and starts a statement, as the top-level
+    # statements of a tidy source do. One past the last line if there is none.
+    def resumeLine(self, line: int) -> int:
+        while line <= len(self.lines):
+            text: str = self.lines[line - 1]
+            if text[:1] not in ["", " ", "\t"] and \
+               self.tokens[line - 1][0].kind not in [TokType.NEWLINE, TokType.END, TokType.ELSE, TokType.ELSIF]:
+                return line
+            line += 1
+        return line
+
+    # Yields (line, unit index) for the units after the edit, where a new parse
+    # can rejoin the old one
+    def rejoins(self, index: int, oldLast: int, delta: int):
+        for unit in range(max(index + 1, bisect_right(self.starts, oldLast)), len(self.units)):
+            yield (self.starts[unit] + delta, unit)
+        yield (len(self.lines) + 1, len(self.units))
+
+    def declare(self, unit: Unit, vars: dict, subs: dict) -> None:
+        if unit.vars:
+            vars.update(unit.vars)
+        if isinstance(unit.node, nodes.Sub):
+            subs[unit.node.name] = unit.node
+
+    # Parses the top-level statement starting at a line, given the variables
+    # and SUBs declared before it
+    def parseUnit(self, line: int, vars: dict, subs: dict) -> Unit:
+        parser: UnitParser = UnitParser(LineStream(self.lines, self.tokens, line))
+        parser.vars = dict(vars)
+        parser.subs = dict(subs)
+        parser.depth = 1
+        try:
+            while parser.checkToken(TokType.NEWLINE):
+                parser.nextToken()
+            if parser.checkToken(TokType.EOF):
+                return Unit(len(self.lines) + 1 - line)
+            node: nodes.Node = parser.statement()
+        except SourceError as err:
+            return Unit(0, error=(err.lineno - line, err.errname, err.message))
+
+        unit: Unit = Unit(parser.lexer.lineno - line, node)
+        unit.vars = {name: vtype for name, vtype in parser.vars.items() if name not in vars}
+        return unit
+
+    # Lowers a copy of the unit's statement on its own, so it can be generated
+    # again later, and keeps the C code for it
+    def generate(self, unit: Unit, vars: dict, subs: dict, shared: bool) -> None:
+        if unit.node is None:
+            return
+        lowering: Lowering = Lowering(nodes.Program([], vars), self.cc)
+        for sub in subs.values():
+            if sub is not unit.node:
+                lowering.defineSub(sub)
+        node: nodes.Node = copy.deepcopy(unit.node)
+        body: list = lowering.lowerBody([node])
+        if isinstance(node, nodes.Sub):
+            node.body = lowering.lowerBody(node.body)
+
+        emitter: Emitter = Emitter(None)
+        codegen: CodeGen = CodeGen(emitter)
+        codegen.globals = shared
+        codegen.body(body)
+        emitter.flushText()
+        unit.header = emitter.header
+        unit.functions = emitter.functions
+        unit.code = emitter.code
+        unit.runtimes = emitter.runtimes
+
+    def regenerate(self) -> None:
+        vars: dict = {}
+        subs: dict = {}
+        for unit in self.units:
+            self.declare(unit, vars, subs)
+            self.generate(unit, vars, subs, self.subCount > 0)
+
+    # (line number, error name, message) of every error in the source
+    def diagnostics(self) -> list:
+        found: list = [(lineno, "LexError", error) for lineno, error in enumerate(self.lexErrors, 1) if error]
+        for unit, line in zip(self.units, self.starts):
+            if unit.error is not None:
+                offset, errname, message = unit.error
+                found.append((line + offset, errname, message))
+        return sorted(found)
+
+    # The C program, from the code kept for each unit
+    def output(self) -> str:
+        emitter: Emitter = Emitter(None)
+        codegen: CodeGen = CodeGen(emitter)
+        codegen.begin(self.subCount > 0)
+        for unit in self.units:
+            emitter.header.extend(unit.header)
+            emitter.functions.extend(unit.functions)
+            emitter.code.extend(unit.code)
+            for name in sorted(unit.runtimes):
+                emitter.useRuntime(name)
+        codegen.end()
+        return emitter.source()
@@ -60,6 +60,10 @@ class TokType(Enum):
     DO = 115
     ELSIF = 116
     FMTPRINT = 117
+    PARALLEL = 122
+    REDUCE = 123
+    SUB = 124
+    CALL = 125
 
     # Types
     NAT = 118
@@ -90,10 +94,33 @@ class Token:
 
     @staticmethod
     def checkIfKeyword(tokText: str) -> TokType:
-        for kind in TokType:
-            if kind.name.lower() == tokText and kind.value >= 100 and kind.value < 200:
-                return kind
-        return None
+        return KEYWORDS.get(tokText)
+
+# Keyword text -> token kind, looked up once per identifier
+KEYWORDS: dict = {kind.name.lower(): kind for kind in TokType if kind.value >= 100 and kind.value < 200}
+
+# Token kinds as single bytes (value + 1), for passing token streams around cheaply
+KIND_OF_CODE: list = [None] * 256
+for kind in TokType:
+    KIND_OF_CODE[kind.value + 1] = kind
+
+# Serves tokens lexed ahead of time (see parlex.py) to the Parser in place of a
+# Lexer. kinds holds token kind codes (TokType value + 1), texts the matching
+# token texts.
+class TokenStream:
+    def __init__(self, input: str, kinds: bytes, texts: list) -> None:
+        self.src_lines: str = (input + "\n").splitlines()
+        self.lineno: int = 1
+        self.kinds: bytes = kinds
+        self.texts: list = texts
+        self.pos: int = 0
+
+    def getToken(self) -> Token:
+        if self.pos >= len(self.kinds):
+            return Token('', TokType.EOF)
+        token: Token = Token(self.texts[self.pos], KIND_OF_CODE[self.kinds[self.pos]])
+        self.pos += 1
+        return token
 
 class Lexer:
     def __init__(self, input: str) -> None:
@@ -199,6 +226,8 @@ class Lexer:
             startPos: int = self.curPos
             
             while self.curChar != '\"':
+                if self.curChar in ['\n', '\0']:
+                    self.abort("Unterminated string")
                 self.nextChar()
             
             tokText: str = self.src[startPos : self.curPos]
@@ -0,0 +1,703 @@
+# The Calci Programming language lowering stage
+#
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import copy
+from collections import ChainMap
+
+from . import tools
+from . import nodes
+from .parallel import privateNames, readsOf
+
+UNROLL_TRIPS: int = 8     # Constant trip loops up to this many iterations get unrolled,
+UNROLL_SIZE: int = 32     # as long as the unrolled code stays within this many statements.
+HINT_SIZE: int = 4        # Largest loop body that gets an unroll hint for gcc/clang.
+SWITCH_ARMS: int = 3      # Shortest IF/ELSIF chain turned into a switch.
+INLINE_SIZE: int = 8      # SUBs up to this many statements (their CALLs expanded) are always inlined,
+HOT_INLINE_SIZE: int = 256  # and up to this many when called from inside a loop.
+INT_MIN: int = -2**31
+INT_MAX: int = 2**31 - 1  # Larger integer literals are longs in C.
+NAT_MOD: int = 2**32
+
+# Calci type of an expression, following C's usual arithmetic conversions.
+# "long" is the type of integer literals too big for an int, which no
+# variable has.
+def exprType(expr: nodes.Node, vars: dict) -> str:
+    if isinstance(expr, nodes.Number):
+        if "." in expr.text:
+            return "real"
+        return "long" if int(expr.text) > INT_MAX else "int"
+    if isinstance(expr, nodes.Ident):
+        return vars[expr.name]
+    if isinstance(expr, nodes.UnaryOp):
+        return exprType(expr.operand, vars)
+    if isinstance(expr, nodes.BinOp):
+        types: set = {exprType(expr.left, vars), exprType(expr.right, vars)}
+        for vtype in ["real", "long", "nat"]:
+            if vtype in types:
+                return vtype
+    return "int"
+
+# Value of a constant expression (a possibly signed number), None otherwise
+def constValue(expr: nodes.Node):
+    sign: int = 1
+    if isinstance(expr, nodes.UnaryOp):
+        sign = -1 if expr.op == "-" else 1
+        expr = expr.operand
+    if not isinstance(expr, nodes.Number):
+        return None
+    return sign * (float(expr.text) if "." in expr.text else int(expr.text))
+
+def numberNode(value: int) -> nodes.Node:
+    if value < 0:
+        return nodes.UnaryOp("-", nodes.Number(str(-value)))
+    return nodes.Number(str(value))
+
+# Name a statement assigns, None if it assigns none
+def assignedBy(stmt: nodes.Node) -> str:
+    if isinstance(stmt, (nodes.Assign, nodes.Input)):
+        return stmt.name
+    if isinstance(stmt, nodes.For):
+        return stmt.ctr
+    if isinstance(stmt, nodes.Loop) and stmt.update is not None:
+        return stmt.update.name
+    return None
+
+# Names assigned anywhere in a statement list, once per assignment
+def assignments(body: list) -> list:
+    return [name for name in map(assignedBy, nodes.walk(body)) if name is not None]
+
+def assignedNames(body: list) -> set:
+    return set(assignments(body))
+
+# Names read anywhere in a statement list, lowered forms included, once per read
+def readNames(body: list) -> list:
+    names: list = []
+    for stmt in nodes.walk(body):
+        if isinstance(stmt, (nodes.Assign, nodes.Print)):
+            names += readsOf(stmt.value)
+        elif isinstance(stmt, nodes.FmtPrint):
+            names += stmt.names
+        elif isinstance(stmt, nodes.If):
+            for cond, _ in stmt.arms:
+                names += readsOf(cond)
+        elif isinstance(stmt, nodes.While):
+            names += readsOf(stmt.cond)
+        elif isinstance(stmt, nodes.Switch):
+            names += readsOf(stmt.subject)
+        elif isinstance(stmt, nodes.For):
+            names += [stmt.ctr] + readsOf(stmt.start) + readsOf(stmt.end) + readsOf(stmt.step)
+        elif isinstance(stmt, nodes.Loop):
+            for assign in [stmt.init, stmt.update]:
+                if assign is not None:
+                    names += readsOf(assign.value)
+            names += readsOf(stmt.cond)
+    return names
+
+def countStatements(body: list) -> int:
+    return sum(1 for _ in nodes.walk(body))
+
+def hasIO(body: list) -> bool:
+    return any(isinstance(stmt, (nodes.PrintText, nodes.Print, nodes.FmtPrint, nodes.Input))
+               for stmt in nodes.walk(body))
+
+# Integer constant the way a 32 bit int or unsigned int computation ends up with it
+def wrapInt(value: int) -> int:
+    value %= 2**32
+    return value - 2**32 if value >= 2**31 else value
+
+# Builds `left op right` for + - *, working it out when both are integer constants
+def foldOp(op: str, left: nodes.Node, right: nodes.Node) -> nodes.Node:
+    a = constValue(left)
+    b = constValue(right)
+    a = a if isinstance(a, int) else None
+    b = b if isinstance(b, int) else None
+    if a is not None and b is not None:
+        return numberNode(wrapInt({"+": a + b, "-": a - b, "*": a * b}[op]))
+    if op == "*" and 0 in [a, b]:
+        return nodes.Number("0")
+    if (op == "*" and a == 1) or (op == "+" and a == 0):
+        return right
+    if (op == "*" and b == 1) or (op in ["+", "-"] and b == 0):
+        return left
+    return nodes.BinOp(op, left, right)
+
+def isZero(expr: nodes.Node) -> bool:
+    return constValue(expr) == 0
+
+# Coefficient of `iv` in an integer expression made of + - * that is a linear
+# function of it, as an expression of the `invariant` variables. None if the
+# expression isn't one, or reads any other variable.
+def linearCoef(expr: nodes.Node, iv: str, invariant: set) -> nodes.Node:
+    if isinstance(expr, nodes.Number):
+        return None if "." in expr.text else nodes.Number("0")
+    if isinstance(expr, nodes.Ident):
+        if expr.name == iv:
+            return nodes.Number("1")
+        return nodes.Number("0") if expr.name in invariant else None
+    if isinstance(expr, nodes.UnaryOp):
+        coef: nodes.Node = linearCoef(expr.operand, iv, invariant)
+        return coef if coef is None or expr.op == "+" else foldOp("-", nodes.Number("0"), coef)
+    if isinstance(expr, nodes.BinOp) and expr.op in ["+", "-", "*"]:
+        left: nodes.Node = linearCoef(expr.left, iv, invariant)
+        right: nodes.Node = linearCoef(expr.right, iv, invariant)
+        if left is None or right is None:
+            return None
+        if expr.op != "*":
+            return foldOp(expr.op, left, right)
+        if isZero(left):
+            return foldOp("*", expr.left, right)
+        if isZero(right):
+            return foldOp("*", left, expr.right)
+    return None
+
+def hasProduct(expr: nodes.Node) -> bool:
+    if isinstance(expr, nodes.UnaryOp):
+        return hasProduct(expr.operand)
+    if isinstance(expr, nodes.BinOp):
+        return expr.op == "*" or hasProduct(expr.left) or hasProduct(expr.right)
+    return False
+
+# Identifies the value of an expression: expressions with equal keys are equal
+# as long as the variables they read keep their values. The operands of + and *
+# are put in order, as those commute.
+def valueKey(expr: nodes.Node) -> tuple:
+    if isinstance(expr, nodes.Number):
+        return ("n", expr.text)
+    if isinstance(expr, nodes.Ident):
+        return ("v", expr.name)
+    if isinstance(expr, nodes.UnaryOp):
+        return ("u", expr.op, valueKey(expr.operand))
+    if isinstance(expr, nodes.BinOp):
+        operands: list = [valueKey(expr.left), valueKey(expr.right)]
+        if expr.op in ["+", "*"]:
+            operands.sort(key=repr)
+        return ("b", expr.op, *operands)
+    return ("?", id(expr))
+
+# One value of the value numbering, computed while none of `reads` changes
+class ValueEntry:
+    def __init__(self, reads: set) -> None:
+        self.reads: set = reads
+        self.count: int = 1           # Computations of the value in the statement list
+        self.temp: str = None         # Temporary holding it, once there is one
+
+# Expressions of a statement that are evaluated once, where it stands
+def evaluatedOnce(stmt: nodes.Node) -> list:
+    if isinstance(stmt, (nodes.Assign, nodes.Print)):
+        return [stmt.value]
+    if isinstance(stmt, nodes.If):
+        cond: nodes.Compare = stmt.arms[0][0]     # Later arms only run if the first fails
+        return [cond.first] + [operand for _, operand in cond.rest]
+    return []
+
+class Lowering:
+    def __init__(self, program: nodes.Program, cc: str) -> None:
+        self.program: nodes.Program = program
+        self.vars: ChainMap = ChainMap({}, program.vars)  # Variables, and the temporaries made so far
+        self.hints: bool = tools.ccFamily(cc) in ["gcc", "clang"]
+        self.openmp: bool = self.hints    # Other compilers run PARALLEL FOR serially
+        self.temps: int = 0
+        self.subs: dict = {}          # SUBs by name
+        self.subSizes: dict = {}      # Statements in each SUB with its CALLs expanded
+        self.callSites: dict = {}     # CALLs of each SUB in the source, set by run
+        self.outOfLine: set = set()   # SUBs called as C functions
+        self.loopDepth: int = 0
+        self.inSub: int = 0           # SUB bodies being lowered, whose loops can run more than once
+        self.steppers: list = []      # (variable, statement list, statement stepping it, accumulator setups)
+
+    def run(self) -> nodes.Program:
+        for stmt in nodes.walk(self.program.body):
+            if isinstance(stmt, nodes.Call):
+                self.callSites[stmt.name] = self.callSites.get(stmt.name, 0) + 1
+
+        body: list = self.lowerBody(self.program.body)
+
+        # A SUB only calls earlier ones, so going backwards every call of a SUB
+        # has been lowered by the time it is reached. SUBs that ended up fully
+        # inlined leave just their LETs behind.
+        for index in reversed(range(len(body))):
+            stmt: nodes.Node = body[index]
+            if isinstance(stmt, nodes.Sub):
+                if stmt.name in self.outOfLine:
+                    self.inSub += 1
+                    stmt.body = self.lowerBody(stmt.body)
+                    self.inSub -= 1
+                else:
+                    body[index:index + 1] = [inner for inner in nodes.walk(stmt.body)
+                                             if isinstance(inner, nodes.Let)]
+
+        self.removeDeadCounters(body)
+        self.program.body = body
+        return self.program
+
+    # Drops the stepping of loop counters left with no use but setting up the
+    # accumulators that took their place, see reduceStrength.
+    def removeDeadCounters(self, body: list) -> None:
+        if not self.steppers:
+            return
+        reads: list = readNames(body)
+        names: list = [name for name, _, _, _ in self.steppers]
+        for name, top, stmt, setups in self.steppers:
+            # Stepped in one loop only, that runs once, so the setups see its first value
+            if names.count(name) == 1 and reads.count(name) == readNames([stmt] + setups).count(name):
+                top.remove(stmt)
+
+    # Lowers a statement list. SUBs split it into runs, in each of which
+    # repeated arithmetic is computed once into temporaries local to the run.
+    def lowerBody(self, body: list) -> list:
+        lowered: list = []
+        run: list = []
+        for stmt in body + [None]:
+            if stmt is not None and not isinstance(stmt, nodes.Sub):
+                run.append(stmt)
+                continue
+            if run:
+                decls: list = []
+                statements: list = self.lowerStatements(self.commonSubexpressions(run, decls))
+                if decls:
+                    block: nodes.Block = nodes.Block(decls, statements)
+                    block.lineno = run[0].lineno
+                    statements = [block]
+                lowered.extend(statements)
+                run = []
+            if stmt is not None:
+                lowered.extend(self.lowerStatements([stmt]))
+        return lowered
+
+    def lowerStatements(self, body: list) -> list:
+        lowered: list = []
+        for stmt in body:
+            if isinstance(stmt, nodes.For):
+                lowered.extend(self.lowerFor(stmt))
+            elif isinstance(stmt, nodes.If):
+                lowered.append(self.lowerIf(stmt))
+            elif isinstance(stmt, nodes.Call):
+                lowered.extend(self.lowerCall(stmt))
+            elif isinstance(stmt, nodes.Sub):
+                self.defineSub(stmt)
+                lowered.append(stmt)
+            else:
+                loop: bool = isinstance(stmt, nodes.While)
+                self.loopDepth += loop
+                for inner in nodes.bodiesOf(stmt):
+                    inner[:] = self.lowerBody(inner)
+                self.loopDepth -= loop
+                decls: list = []
+                setups: list = self.reduceStrength(stmt.body, decls, stmt) if loop else []
+                if decls:
+                    block: nodes.Block = nodes.Block(decls, setups + [stmt])
+                    block.lineno = stmt.lineno
+                    stmt = block
+                lowered.append(stmt)
+        return lowered
+
+    # Value numbering over a statement list: an expression computed again while
+    # its variables are unchanged is computed once, into a temporary added to
+    # `decls`. A VAR or INPUT ends the values reading its variable, a nested
+    # statement the values reading anything assigned inside it, and a CALL all.
+    def commonSubexpressions(self, body: list, decls: list) -> list:
+        available: dict = {}          # Value key -> its current ValueEntry
+        readers: dict = {}            # Variable -> (key, entry) pairs of values reading it
+        entries: dict = {}            # id of an expression -> its ValueEntry
+
+        def number(expr: nodes.Node) -> None:
+            if isinstance(expr, nodes.UnaryOp):
+                number(expr.operand)
+            if not isinstance(expr, nodes.BinOp):
+                return
+            key: tuple = valueKey(expr)
+            entry: ValueEntry = available.get(key)
+            if entry is not None:
+                entry.count += 1      # Its operands are available too, so stop here
+                entries[id(expr)] = entry
+                return
+            entry = ValueEntry(set(readsOf(expr)))
+            available[key] = entry
+            entries[id(expr)] = entry
+            for name in entry.reads:
+                readers.setdefault(name, []).append((key, entry))
+            number(expr.left)
+            number(expr.right)
+
+        def kill(names: set) -> None:
+            for name in names:
+                for key, entry in readers.pop(name, []):
+                    if available.get(key) is entry:
+                        del available[key]
+
+        for stmt in body:
+            for expr in evaluatedOnce(stmt):
+                number(expr)
+            if isinstance(stmt, nodes.Call):
+                available.clear()
+                readers.clear()
+            elif isinstance(stmt, (nodes.Assign, nodes.Input)):
+                kill({stmt.name})
+            elif nodes.bodiesOf(stmt):
+                kill(assignedNames([stmt]))
+        if not any(entry.count > 1 for entry in entries.values()):
+            return body
+
+        def rewrite(expr: nodes.Node, before: list) -> nodes.Node:
+            if isinstance(expr, nodes.UnaryOp):
+                expr.operand = rewrite(expr.operand, before)
+            if not isinstance(expr, nodes.BinOp):
+                return expr
+            entry: ValueEntry = entries.get(id(expr))
+            if entry is not None and entry.count > 1 and entry.temp is not None:
+                return nodes.Ident(entry.temp)
+            expr.left = rewrite(expr.left, before)
+            expr.right = rewrite(expr.right, before)
+            if entry is None or entry.count == 1:
+                return expr
+            decls.append(self.newTemp("c", expr))
+            self.temps += 1
+            entry.temp = decls[-1][1]
+            before.append(nodes.Assign(entry.temp, expr))
+            return nodes.Ident(entry.temp)
+
+        rewritten: list = []
+        for stmt in body:
+            before: list = []
+            if isinstance(stmt, (nodes.Assign, nodes.Print)):
+                stmt.value = rewrite(stmt.value, before)
+            elif isinstance(stmt, nodes.If):
+                cond: nodes.Compare = stmt.arms[0][0]
+                cond.first = rewrite(cond.first, before)
+                cond.rest = [(op, rewrite(operand, before)) for op, operand in cond.rest]
+            for assign in before:
+                assign.lineno = stmt.lineno
+            rewritten.extend(before)
+            rewritten.append(stmt)
+        return rewritten
+
+    # Strength reduction: an integer expression in an innermost loop that
+    # multiplies and is a linear function of an induction variable (the FOR
+    # counter, or a variable stepped by a fixed amount once per iteration) is
+    # kept in an accumulator instead. It is set up before the loop, added the
+    # expression's change at every step of the variable, and assigned or printed
+    # where the expression was. Accumulators are unsigned, so stepping past the
+    # last value can't overflow, and only replace whole values going to an
+    # integer, which convert them back.
+    # Returns the setup, adding the accumulators to `decls`.
+    def reduceStrength(self, body: list, decls: list, loop: nodes.Node, ctr: str = None, step: int = None) -> list:
+        statements: list = []
+        pending: list = [body]
+        while pending:
+            for stmt in pending.pop():
+                if isinstance(stmt, (nodes.While, nodes.For, nodes.Loop, nodes.Call)):
+                    return []         # Only innermost loops, and a SUB might assign anything
+                statements.append(stmt)
+                pending.extend(nodes.bodiesOf(stmt))
+        top: list = body
+        while len(top) == 1 and isinstance(top[0], nodes.Block):
+            top = top[0].body
+        writes: list = [name for name in map(assignedBy, statements) if name is not None]
+        reads: set = set()
+        for stmt in statements:
+            if isinstance(stmt, (nodes.Assign, nodes.Print)):
+                reads.update(readsOf(stmt.value))
+        invariant: set = {name for name in reads if self.vars.get(name) in ["int", "nat"] and name not in writes}
+
+        steps: dict = {}              # Induction variable -> (step, statement stepping it, None for the counter)
+        if ctr is not None and self.vars[ctr] in ["int", "nat"] and ctr not in writes:
+            steps[ctr] = (numberNode(step), None)
+        for stmt in top:
+            if not isinstance(stmt, nodes.Assign) or self.vars.get(stmt.name) not in ["int", "nat"] or \
+               writes.count(stmt.name) != 1 or not isinstance(stmt.value, nodes.BinOp):
+                continue
+            value: nodes.BinOp = stmt.value
+            if isinstance(value.left, nodes.Ident) and value.left.name == stmt.name and value.op in ["+", "-"]:
+                amount: nodes.Node = value.right
+            elif isinstance(value.right, nodes.Ident) and value.right.name == stmt.name and value.op == "+":
+                amount: nodes.Node = value.left
+            else:
+                continue
+            if isinstance(constValue(amount), int) or \
+               (isinstance(amount, nodes.Ident) and amount.name in invariant):
+                steps[stmt.name] = (foldOp(value.op, nodes.Number("0"), amount), stmt)
+
+        ctypes: dict = {name: ctype for stmt in statements if isinstance(stmt, nodes.Block)
+                        for ctype, name in stmt.decls}
+        ctypes.update((name, tools.getcType(self.vars[name])) for name in writes if name in self.vars)
+
+        accumulators: dict = {}       # Value key -> accumulator
+        setups: dict = {name: [] for name in steps}
+        updates: dict = {name: [] for name in steps}
+        for stmt in statements:
+            assign: bool = isinstance(stmt, nodes.Assign) and ctypes.get(stmt.name) in ["int", "unsigned int"]
+            if not assign and not (isinstance(stmt, nodes.Print) and stmt.vtype in ["int", "nat"]):
+                continue
+            names: list = readsOf(stmt.value)
+            found: list = [name for name in steps if name in names and steps[name][1] is not stmt]
+            if len(found) != 1 or not hasProduct(stmt.value):
+                continue
+            name: str = found[0]
+            coef: nodes.Node = linearCoef(stmt.value, name, invariant)
+            if coef is None:
+                continue
+
+            key: tuple = valueKey(stmt.value)
+            if key not in accumulators:
+                accumulators[key] = f"calci_i{self.temps}"
+                self.temps += 1
+                acc: str = accumulators[key]
+                decls.append(("unsigned int", acc))
+                setups[name].append(nodes.Assign(acc, stmt.value))
+                stepBy: nodes.Node = steps[name][0]
+                sign: str = "+"
+                if isinstance(constValue(stepBy), int) and constValue(stepBy) < 0:
+                    sign, stepBy = "-", numberNode(-constValue(stepBy))
+                amount: nodes.Node = foldOp("*", copy.deepcopy(coef), stepBy)
+                if constValue(amount) is None:
+                    decls.append(("unsigned int", acc + "d"))
+                    setups[name].append(nodes.Assign(acc + "d", copy.deepcopy(coef)))
+                    if constValue(stepBy) != 1:
+                        setups[name].append(nodes.Assign(acc + "d", nodes.BinOp("*", nodes.Ident(acc + "d"), stepBy)))
+                    amount = nodes.Ident(acc + "d")
+                elif constValue(amount) < 0:
+                    sign, amount = "-" if sign == "+" else "+", numberNode(-constValue(amount))
+                if constValue(amount) != 0:
+                    updates[name].append(nodes.Assign(acc, nodes.BinOp(sign, nodes.Ident(acc), amount)))
+            stmt.value = nodes.Ident(accumulators[key])
+
+        enteredOnce: bool = self.loopDepth == 0 and self.inSub == 0
+        for name, (_, stepper) in steps.items():
+            for node in setups[name] + updates[name]:
+                node.lineno = loop.lineno
+            if stepper is None:
+                top.extend(updates[name])
+                continue
+            index: int = next(index for index, stmt in enumerate(top) if stmt is stepper)
+            top[index + 1:index + 1] = updates[name]
+            if enteredOnce and not (isinstance(loop, nodes.While) and name in readsOf(loop.cond)):
+                self.steppers.append((name, top, stepper, setups[name]))
+        return [setup for name in steps for setup in setups[name]]
+
+    def defineSub(self, stmt: nodes.Sub) -> None:
+        self.subs[stmt.name] = stmt
+        self.subSizes[stmt.name] = sum(self.subSizes[inner.name] if isinstance(inner, nodes.Call) else 1
+                                       for inner in nodes.walk(stmt.body))
+
+    # Inlines small SUBs, ones called from a single place and ones called from
+    # inside loops unless they are huge. Other CALLs stay calls of a C function.
+    def lowerCall(self, stmt: nodes.Call) -> list:
+        size: int = self.subSizes[stmt.name]
+        if size <= INLINE_SIZE or self.callSites.get(stmt.name) == 1 or \
+           (self.loopDepth > 0 and size <= HOT_INLINE_SIZE):
+            self.inSub += 1
+            body: list = self.lowerBody(nodes.inlineBody(self.subs[stmt.name]))
+            self.inSub -= 1
+            return body
+        self.outOfLine.add(stmt.name)
+        return [stmt]
+
+    # An IF/ELSIF chain comparing one integer variable with distinct constants
+    # becomes a switch, which C compilers turn into a jump table or a binary search.
+    # Every constant has to keep its meaning as a case label, converted to the
+    # variable's type: a long is compared as a long, so an int can't equal one
+    # and a nat only those below 2^32, and a nat equals a negative int as it
+    # does the unsigned value with the same bits.
+    def lowerIf(self, stmt: nodes.If) -> nodes.Node:
+        for body in nodes.bodiesOf(stmt):
+            body[:] = self.lowerBody(body)
+        if len(stmt.arms) < SWITCH_ARMS:
+            return stmt
+
+        subject: str = None
+        cases: list = []
+        seen: set = set()
+        for cond, body in stmt.arms:
+            if len(cond.rest) != 1 or cond.rest[0][0] != "==":
+                return stmt
+            left: nodes.Node = cond.first
+            right: nodes.Node = cond.rest[0][1]
+            if isinstance(right, nodes.Ident):
+                left, right = right, left
+            value = constValue(right)
+            if not isinstance(left, nodes.Ident) or not isinstance(value, int):
+                return stmt
+            if subject is None:
+                subject = left.name
+            if left.name != subject or self.vars[subject] not in ["int", "nat"]:
+                return stmt
+            if not INT_MIN <= value <= (NAT_MOD - 1 if self.vars[subject] == "nat" else INT_MAX):
+                return stmt
+            converted: int = value % NAT_MOD if self.vars[subject] == "nat" else value
+            if converted not in seen:     # Later duplicates could never be reached
+                seen.add(converted)
+                cases.append((value, body))
+
+        switch: nodes.Switch = nodes.Switch(nodes.Ident(subject), cases, stmt.orelse)
+        switch.lineno = stmt.lineno
+        return switch
+
+    def newTemp(self, prefix: str, expr: nodes.Node) -> tuple:
+        name: str = f"calci_{prefix}{self.temps}"
+        vtype: str = exprType(expr, self.vars)
+        self.vars[name] = vtype       # Expressions the temporary takes part in get typed too
+        return (tools.getcType(vtype), name)
+
+    # Unrolls a loop whose start, end and step are integer constants, None if it doesn't pay off
+    def unrollFor(self, stmt: nodes.For, body: list, start, end, step) -> list:
+        if not all(isinstance(value, int) for value in [start, end, step]) or step == 0:
+            return None
+        if self.vars[stmt.ctr] not in ["int", "nat"] or stmt.ctr in assignedNames(body):
+            return None
+        if any(isinstance(inner, nodes.Call) for inner in nodes.walk(body)):
+            return None               # The SUB might assign the counter, and is big anyway
+
+        if step > 0:
+            trips: int = max(0, -((start - end) // step))
+        else:
+            trips: int = max(0, -((end - start) // -step))
+        final: int = start + trips * step
+        if trips > UNROLL_TRIPS or trips * countStatements(body) > UNROLL_SIZE:
+            return None
+        if self.vars[stmt.ctr] == "nat" and min(start, final) < 0:
+            return None
+
+        unrolled: list = []
+        for trip in range(trips):
+            unrolled.append(nodes.Assign(stmt.ctr, numberNode(start + trip * step)))
+            unrolled.extend(copy.deepcopy(body))
+        unrolled.append(nodes.Assign(stmt.ctr, numberNode(final)))
+        for node in unrolled:
+            node.lineno = node.lineno or stmt.lineno
+        return unrolled
+
+    # FOR counts up to (or, with a negative step, down to) its bound, which
+    # along with the step is evaluated once before the first iteration.
+    def lowerFor(self, stmt: nodes.For) -> list:
+        self.loopDepth += 1
+        body: list = self.lowerBody(stmt.body)
+        self.loopDepth -= 1
+        start = constValue(stmt.start)
+        end = constValue(stmt.end)
+        step = constValue(stmt.step)
+
+        if stmt.parallel and self.openmp:
+            return self.lowerParallelFor(stmt, body, start, end, step)
+
+        unrolled: list = self.unrollFor(stmt, body, start, end, step)
+        if unrolled is not None:
+            return unrolled
+
+        ctr: nodes.Ident = nodes.Ident(stmt.ctr)
+        decls: list = []
+        init: list = [nodes.Assign(stmt.ctr, stmt.start)]
+        endExpr: nodes.Node = stmt.end
+        stepExpr: nodes.Node = stmt.step
+
+        if end is None:
+            decls.append(self.newTemp("e", stmt.end))
+            endExpr = nodes.Ident(decls[-1][1])
+            init.append(nodes.Assign(endExpr.name, stmt.end))
+        if step is None:
+            decls.append(self.newTemp("s", stmt.step))
+            stepExpr = nodes.Ident(decls[-1][1])
+            init.append(nodes.Assign(stepExpr.name, stmt.step))
+        if decls:
+            self.temps += 1
+
+        if step is not None:
+            op: str = ">" if step < 0 else "<"
+            cond: nodes.Node = nodes.Compare(ctr, [(op, endExpr)])
+            if step < 0:
+                update: nodes.Node = nodes.BinOp("-", ctr, numberNode(-step))
+            else:
+                update: nodes.Node = nodes.BinOp("+", ctr, stmt.step)
+        else:
+            cond: nodes.Node = nodes.Compare(ctr, [("<", endExpr)])
+            if exprType(stmt.step, self.vars) != "nat":
+                cond = nodes.Select(nodes.Compare(stepExpr, [("<", nodes.Number("0"))]),
+                                    nodes.Compare(ctr, [(">", endExpr)]), cond)
+            update: nodes.Node = nodes.BinOp("+", ctr, stepExpr)
+
+        init += self.reduceStrength(body, decls, stmt, stmt.ctr if isinstance(step, int) else None, step)
+
+        pragmas: list = []
+        if self.hints and step is not None and not hasIO(body) and countStatements(body) <= HINT_SIZE:
+            pragmas.append("GCC unroll 4")
+
+        loop: nodes.Loop = nodes.Loop(None, cond, nodes.Assign(stmt.ctr, update), body, pragmas)
+        loop.lineno = stmt.lineno
+        if decls:
+            block: nodes.Block = nodes.Block(decls, init + [loop])
+            block.lineno = stmt.lineno
+            return [block]
+        loop.init = init[0]
+        return [loop]
+
+    # OpenMP needs the canonical for(i = lb; i < ub; i += k) form, so the start
+    # goes through a temporary as well, keeping start-then-end evaluation order.
+    def lowerParallelFor(self, stmt: nodes.For, body: list, start, end, step) -> list:
+        decls: list = []
+        init: list = []
+        startExpr: nodes.Node = stmt.start
+        endExpr: nodes.Node = stmt.end
+
+        if start is None:
+            decls.append(self.newTemp("b", stmt.start))
+            startExpr = nodes.Ident(decls[-1][1])
+            init.append(nodes.Assign(startExpr.name, stmt.start))
+        if end is None:
+            decls.append(self.newTemp("e", stmt.end))
+            endExpr = nodes.Ident(decls[-1][1])
+            init.append(nodes.Assign(endExpr.name, stmt.end))
+        if decls:
+            self.temps += 1
+        # lastprivate leaves the counter alone when there are no iterations
+        init.append(nodes.Assign(stmt.ctr, startExpr))
+        init[-1].lineno = stmt.lineno
+
+        ctr: nodes.Ident = nodes.Ident(stmt.ctr)
+        if step < 0:
+            cond: nodes.Node = nodes.Compare(ctr, [(">", endExpr)])
+            update: nodes.Node = nodes.BinOp("-", ctr, numberNode(-step))
+        else:
+            cond: nodes.Node = nodes.Compare(ctr, [("<", endExpr)])
+            update: nodes.Node = nodes.BinOp("+", ctr, stmt.step)
+
+        pragma: str = "omp parallel for"
+        for op, name in stmt.reductions:
+            pragma += f" reduction({op}:{name})"
+        pragma += f" lastprivate({','.join([stmt.ctr] + privateNames(stmt))})"
+
+        loop: nodes.Loop = nodes.Loop(nodes.Assign(stmt.ctr, startExpr), cond,
+                                      nodes.Assign(stmt.ctr, update), body, [pragma])
+        loop.lineno = stmt.lineno
+        if decls:
+            block: nodes.Block = nodes.Block(decls, init + [loop])
+            block.lineno = stmt.lineno
+            return [block]
+        return init + [loop]
@@ -0,0 +1,207 @@
+# The Calci Programming language syntax tree
+#
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import copy
+
+# Nodes built by the parser (see Calci.g for the rules they come from) and the
+# lower level loop forms produced by the lowering stage.
+
+class Node:
+    lineno: int = 0
+
+# Expressions
+
+class Number(Node):
+    def __init__(self, text: str) -> None:
+        self.text: str = text
+
+class Ident(Node):
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+
+class UnaryOp(Node):
+    def __init__(self, op: str, operand: Node) -> None:
+        self.op: str = op
+        self.operand: Node = operand
+
+class BinOp(Node):
+    def __init__(self, op: str, left: Node, right: Node) -> None:
+        self.op: str = op
+        self.left: Node = left
+        self.right: Node = right
+
+class Compare(Node):
+    def __init__(self, first: Node, rest: list) -> None:
+        self.first: Node = first
+        self.rest: list = rest        # (C operator, expression) pairs
+
+class Select(Node):
+    def __init__(self, cond: Node, then: Node, orelse: Node) -> None:
+        self.cond: Node = cond
+        self.then: Node = then
+        self.orelse: Node = orelse
+
+# Statements
+
+class PrintText(Node):
+    def __init__(self, text: str, newline: bool) -> None:
+        self.text: str = text
+        self.newline: bool = newline
+
+class Print(Node):
+    def __init__(self, vtype: str, value: Node, newline: bool) -> None:
+        self.vtype: str = vtype
+        self.value: Node = value
+        self.newline: bool = newline
+
+class FmtPrint(Node):
+    def __init__(self, fmt: str, names: list) -> None:
+        self.fmt: str = fmt
+        self.names: list = names
+
+class Input(Node):
+    def __init__(self, vtype: str, name: str) -> None:
+        self.vtype: str = vtype
+        self.name: str = name
+
+class Assign(Node):
+    def __init__(self, name: str, value: Node) -> None:
+        self.name: str = name
+        self.value: Node = value
+
+class Let(Node):
+    def __init__(self, names: list, vtype: str) -> None:
+        self.names: list = names
+        self.vtype: str = vtype
+
+class If(Node):
+    def __init__(self, arms: list, orelse: list = None) -> None:
+        self.arms: list = arms        # (condition, body) pairs
+        self.orelse: list = orelse
+
+class While(Node):
+    def __init__(self, cond: Node, body: list) -> None:
+        self.cond: Node = cond
+        self.body: list = body
+
+class For(Node):
+    def __init__(self, ctr: str, start: Node, end: Node, step: Node, body: list,
+                 parallel: bool = False, reductions: list = None) -> None:
+        self.ctr: str = ctr
+        self.start: Node = start
+        self.end: Node = end
+        self.step: Node = step
+        self.body: list = body
+        self.parallel: bool = parallel
+        self.reductions: list = reductions or []  # (operator, variable) pairs
+
+class Sub(Node):
+    def __init__(self, name: str, body: list) -> None:
+        self.name: str = name
+        self.body: list = body
+
+class Call(Node):
+    def __init__(self, name: str) -> None:
+        self.name: str = name
+
+class Program(Node):
+    def __init__(self, body: list, vars: dict) -> None:
+        self.body: list = body
+        self.vars: dict = vars        # Variable name -> Calci type
+
+# Lowered forms
+
+class Block(Node):
+    def __init__(self, decls: list, body: list) -> None:
+        self.decls: list = decls      # (C type, name) pairs local to the block
+        self.body: list = body
+
+class Switch(Node):
+    def __init__(self, subject: Node, cases: list, default: list = None) -> None:
+        self.subject: Node = subject
+        self.cases: list = cases      # (constant, body) pairs
+        self.default: list = default
+
+class Loop(Node):
+    def __init__(self, init: Node, cond: Node, update: Node, body: list, pragmas: list = None) -> None:
+        self.init: Node = init
+        self.cond: Node = cond
+        self.update: Node = update
+        self.body: list = body
+        self.pragmas: list = pragmas or []
+
+# Yields the statement lists nested directly inside a statement
+def bodiesOf(stmt: Node) -> list:
+    if isinstance(stmt, If):
+        bodies: list = [body for _, body in stmt.arms]
+        if stmt.orelse is not None:
+            bodies.append(stmt.orelse)
+        return bodies
+    if isinstance(stmt, Switch):
+        bodies: list = [body for _, body in stmt.cases]
+        if stmt.default is not None:
+            bodies.append(stmt.default)
+        return bodies
+    if isinstance(stmt, (While, For, Sub, Block, Loop)):
+        return [stmt.body]
+    return []
+
+# Yields every statement in a statement list, nested ones included
+def walk(body: list):
+    for stmt in body:
+        yield stmt
+        for inner in bodiesOf(stmt):
+            yield from walk(inner)
+
+# Copy of a SUB's body to put in place of a CALL. LETs are left out of the
+# copy, the SUB itself declares their variables once.
+def inlineBody(sub: Sub) -> list:
+    def strip(body: list) -> list:
+        kept: list = [stmt for stmt in body if not isinstance(stmt, Let)]
+        for stmt in kept:
+            for inner in bodiesOf(stmt):
+                inner[:] = strip(inner)
+        return kept
+    return strip(copy.deepcopy(sub.body))
+
+# Replaces every CALL in a statement list, nested ones included, with the body
+# of its SUB, given the SUBs by name
+def expandCalls(body: list, subs: dict) -> list:
+    expanded: list = []
+    for stmt in body:
+        if isinstance(stmt, Call):
+            expanded.extend(expandCalls(inlineBody(subs[stmt.name]), subs))
+        else:
+            for inner in bodiesOf(stmt):
+                inner[:] = expandCalls(inner, subs)
+            expanded.append(stmt)
+    return expanded
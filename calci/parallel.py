@@ -0,0 +1,244 @@
+# The Calci Programming language PARALLEL FOR checks
+#
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+from . import nodes
+
+# Identifiers read by an expression
+def readsOf(expr: nodes.Node) -> list:
+    if isinstance(expr, nodes.Ident):
+        return [expr.name]
+    if isinstance(expr, nodes.UnaryOp):
+        return readsOf(expr.operand)
+    if isinstance(expr, nodes.BinOp):
+        return readsOf(expr.left) + readsOf(expr.right)
+    if isinstance(expr, nodes.Compare):
+        names: list = readsOf(expr.first)
+        for _, operand in expr.rest:
+            names += readsOf(operand)
+        return names
+    if isinstance(expr, nodes.Select):
+        return readsOf(expr.cond) + readsOf(expr.then) + readsOf(expr.orelse)
+    return []
+
+# Variable accesses of a statement list in execution order, as
+# (kind, name, conditional, node) tuples where kind is "read", "test" (a read
+# inside a condition) or "write", and node is the writing statement.
+def accesses(body: list, cond: bool = False) -> list:
+    events: list = []
+    for stmt in body:
+        if isinstance(stmt, nodes.Print):
+            events += [("read", name, cond, None) for name in readsOf(stmt.value)]
+        elif isinstance(stmt, nodes.FmtPrint):
+            events += [("read", name, cond, None) for name in stmt.names]
+        elif isinstance(stmt, nodes.Input):
+            events.append(("write", stmt.name, cond, stmt))
+        elif isinstance(stmt, nodes.Assign):
+            events += [("read", name, cond, None) for name in readsOf(stmt.value)]
+            events.append(("write", stmt.name, cond, stmt))
+        elif isinstance(stmt, nodes.If):
+            for index, (test, inner) in enumerate(stmt.arms):
+                events += [("test", name, cond or index > 0, None) for name in readsOf(test)]
+                events += accesses(inner, True)
+            if stmt.orelse is not None:
+                events += accesses(stmt.orelse, True)
+        elif isinstance(stmt, nodes.While):
+            events += [("test", name, cond, None) for name in readsOf(stmt.cond)]
+            events += accesses(stmt.body, True)
+        elif isinstance(stmt, nodes.For):
+            events += [("read", name, cond, None) for name in readsOf(stmt.start)]
+            events.append(("write", stmt.ctr, cond, stmt))
+            for expr in [stmt.end, stmt.step]:
+                events += [("read", name, cond, None) for name in readsOf(expr)]
+            events += accesses(stmt.body, True)
+    return events
+
+# First variable of `written` that the body may read before assigning it in the
+# same iteration, given the variables already assigned on entry. Updates
+# `assigned` with the variables the body assigns on every path.
+def readBeforeWrite(body: list, assigned: set, written: set) -> str:
+    def check(names: list) -> str:
+        for name in names:
+            if name in written and name not in assigned:
+                return name
+        return None
+
+    for stmt in body:
+        found: str = None
+        if isinstance(stmt, nodes.Print):
+            found = check(readsOf(stmt.value))
+        elif isinstance(stmt, nodes.FmtPrint):
+            found = check(stmt.names)
+        elif isinstance(stmt, nodes.Input):
+            assigned.add(stmt.name)
+        elif isinstance(stmt, nodes.Assign):
+            found = check(readsOf(stmt.value))
+            assigned.add(stmt.name)
+        elif isinstance(stmt, nodes.If):
+            branches: list = []
+            for test, inner in stmt.arms:
+                found = found or check(readsOf(test))
+                branch: set = set(assigned)
+                found = found or readBeforeWrite(inner, branch, written)
+                branches.append(branch)
+            if stmt.orelse is not None:
+                branch: set = set(assigned)
+                found = found or readBeforeWrite(stmt.orelse, branch, written)
+                branches.append(branch)
+            else:
+                branches.append(set(assigned))
+            assigned.update(set.intersection(*branches))
+        elif isinstance(stmt, nodes.While):
+            found = check(readsOf(stmt.cond)) or readBeforeWrite(stmt.body, set(assigned), written)
+        elif isinstance(stmt, nodes.For):
+            found = check(readsOf(stmt.start))
+            assigned.add(stmt.ctr)
+            found = found or check(readsOf(stmt.end) + readsOf(stmt.step)) or \
+                    readBeforeWrite(stmt.body, set(assigned), written)
+        if found is not None:
+            return found
+    return None
+
+# Whether an assignment is a valid update of a + or * reduction variable:
+# name := name op e1 op e2 ... with no other use of name on the right
+def isReductionUpdate(stmt: nodes.Node, op: str, name: str) -> bool:
+    if not isinstance(stmt, nodes.Assign):
+        return False
+    ops: list = ["+", "-"] if op == "+" else ["*"]
+    expr: nodes.Node = stmt.value
+    if not (isinstance(expr, nodes.BinOp) and expr.op in ops):
+        return False
+    while isinstance(expr, nodes.BinOp) and expr.op in ops:
+        if name in readsOf(expr.right):
+            return False
+        expr = expr.left
+    return isinstance(expr, nodes.Ident) and expr.name == name
+
+# Whether two expressions are written the same
+def sameExpr(left: nodes.Node, right: nodes.Node) -> bool:
+    if type(left) is not type(right):
+        return False
+    if isinstance(left, nodes.Number):
+        return left.text == right.text
+    if isinstance(left, nodes.Ident):
+        return left.name == right.name
+    if isinstance(left, nodes.UnaryOp):
+        return left.op == right.op and sameExpr(left.operand, right.operand)
+    if isinstance(left, nodes.BinOp):
+        return left.op == right.op and sameExpr(left.left, right.left) and sameExpr(left.right, right.right)
+    return False
+
+# Whether a statement is a valid update of a max or min reduction variable:
+# IF e > name THEN name := e (e < name for min) with nothing else in the IF,
+# and no use of name in e
+def isExtremumUpdate(stmt: nodes.Node, op: str, name: str) -> bool:
+    if not (isinstance(stmt, nodes.If) and len(stmt.arms) == 1 and stmt.orelse is None):
+        return False
+    test, body = stmt.arms[0]
+    if not (isinstance(test, nodes.Compare) and len(test.rest) == 1 and
+            len(body) == 1 and isinstance(body[0], nodes.Assign) and body[0].name == name):
+        return False
+    cmp, right = test.rest[0]
+    beyond: str = ">" if op == "max" else "<"
+    if cmp == beyond and isinstance(right, nodes.Ident) and right.name == name:
+        expr: nodes.Node = test.first
+    elif cmp == {">": "<", "<": ">"}[beyond] and isinstance(test.first, nodes.Ident) and test.first.name == name:
+        expr: nodes.Node = right    # The same test written as name < e
+    else:
+        return False
+    return name not in readsOf(expr) and sameExpr(expr, body[0].value)
+
+# Returns why a PARALLEL FOR can't run its iterations independently, None if it can
+def checkParallel(stmt: nodes.For, vars: dict) -> str:
+    if vars[stmt.ctr] not in ["int", "nat"]:
+        return f"PARALLEL FOR counter {stmt.ctr} must be nat or int"
+    step: nodes.Node = stmt.step.operand if isinstance(stmt.step, nodes.UnaryOp) else stmt.step
+    if not isinstance(step, nodes.Number):
+        return "PARALLEL FOR needs a constant step"
+    if any(isinstance(inner, (nodes.PrintText, nodes.Print, nodes.FmtPrint, nodes.Input))
+           for inner in nodes.walk(stmt.body)):
+        return "PARALLEL FOR body can't do input or output"
+
+    reductions: dict = {}
+    for op, name in stmt.reductions:
+        if name == stmt.ctr or name in reductions:
+            return f"Invalid reduction variable: {name}"
+        reductions[name] = op
+
+    extremumUpdates: set = set()  # Assignments inside valid max/min updates
+    for inner in nodes.walk(stmt.body):
+        for name, op in reductions.items():
+            if op in ["max", "min"] and isExtremumUpdate(inner, op, name):
+                extremumUpdates.add(id(inner.arms[0][1][0]))
+
+    events: list = accesses(stmt.body)
+    for kind, name, cond, node in events:
+        if name == stmt.ctr:
+            if kind == "write":
+                return f"PARALLEL FOR counter {name} is assigned in the loop body"
+            continue
+
+        if name in reductions:
+            op: str = reductions[name]
+            if op in ["+", "*"]:
+                if kind == "write" and not isReductionUpdate(node, op, name):
+                    return f"Reduction variable {name} must only be updated as {name} := {name} {op} ..."
+            elif kind == "write" and id(node) not in extremumUpdates:
+                beyond: str = ">" if op == "max" else "<"
+                return f"Reduction variable {name} must only be updated as IF e {beyond} {name} THEN var {name} := e"
+
+    # Other variables the body assigns must be assigned before they are read,
+    # and on every path, as the last iteration's value is copied out
+    written: set = {name for kind, name, _, _ in events if kind == "write"} - set(reductions)
+    assigned: set = {stmt.ctr}
+    name: str = readBeforeWrite(stmt.body, assigned, written)
+    if name is not None:
+        return f"Cross-iteration dependency on {name}: read before it is assigned"
+    for kind, name, _, _ in events:
+        if kind == "write" and name in written and name not in assigned:
+            return f"PARALLEL FOR body assigns {name} only on some paths"
+
+    # A reduction variable is read exactly once by each of its updates
+    for name, op in reductions.items():
+        reads: int = sum(1 for event in events if event[1] == name and event[0] != "write")
+        writes: int = sum(1 for event in events if event[1] == name and event[0] == "write")
+        if reads != writes:
+            return f"Reduction variable {name} must only be read by its own updates"
+    return None
+
+# Variables a PARALLEL FOR body assigns, other than its reduction variables
+def privateNames(stmt: nodes.For) -> list:
+    reductions: set = {name for _, name in stmt.reductions}
+    names: list = []
+    for kind, name, _, _ in accesses(stmt.body):
+        if kind == "write" and name not in reductions and name not in names:
+            names.append(name)
+    return names
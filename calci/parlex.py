@@ -0,0 +1,125 @@
+# The Calci Programming language parallel lexer
+#
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Statements end at newlines, comments run to the end of the line and strings
+# can't span lines, so a source split after newlines can be lexed chunk by
+# chunk in separate processes and the token streams joined in order.
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+from . import tools
+from .errors.rterror import RuntimeError
+from .lex import Lexer, TokenStream, TokType
+
+PARALLEL_MIN_SIZE: int = 1 << 20  # Smaller sources aren't worth starting workers for
+CHUNKS_PER_JOB: int = 4
+
+class ChunkError(Exception):
+    def __init__(self, message: str, lineno: int) -> None:
+        super().__init__(message)
+        self.message: str = message
+        self.lineno: int = lineno
+
+class ChunkLexer(Lexer):
+    def abort(self, message: str) -> None:
+        raise ChunkError(message, self.lineno)
+
+# Splits the source after newlines into about `count` chunks of
+# (text, line number of the first line) pairs
+def splitChunks(src: str, count: int) -> list:
+    chunks: list = []
+    target: int = max(1, len(src) // count)
+    pos: int = 0
+    lineno: int = 1
+    while pos < len(src):
+        end: int = src.find("\n", pos + target)
+        end = len(src) if end == -1 else end + 1
+        chunks.append((src[pos:end], lineno))
+        lineno += src.count("\n", pos, end)
+        pos = end
+    return chunks
+
+# Lexes one chunk, returning (token kind codes, "\0" separated token texts, None)
+# or (None, error message, line number of the error). Strings can't hold "\0",
+# which the Lexer reads as the end of input.
+def lexChunk(chunk: tuple) -> tuple:
+    text, firstLine = chunk
+    # Lexer adds the final newline back
+    lexer: ChunkLexer = ChunkLexer(text[:-1] if text.endswith("\n") else text)
+    kinds: bytearray = bytearray()
+    texts: list = []
+    try:
+        while True:
+            token = lexer.getToken()
+            if token.kind == TokType.EOF:
+                break
+            kinds.append(token.kind.value + 1)
+            texts.append(token.text)
+            if token.kind == TokType.NEWLINE:
+                lexer.lineno += 1
+    except ChunkError as err:
+        return (None, err.message, firstLine + err.lineno - 1)
+    return (bytes(kinds), "\0".join(texts), None)
+
+def lexParallel(src: str, jobs: int) -> TokenStream:
+    chunks: list = splitChunks(src, jobs * CHUNKS_PER_JOB)
+    if chunks:
+        # Like Lexer, the last chunk lexes with one newline more than the source has
+        chunks[-1] = (chunks[-1][0] + "\n", chunks[-1][1])
+    with ProcessPoolExecutor(jobs) as pool:
+        results: list = list(pool.map(lexChunk, chunks))
+
+    kinds: list = []
+    texts: list = []
+    for chunkKinds, chunkTexts, errline in results:
+        if chunkKinds is None:
+            tools.throwError(RuntimeError(
+                'LexError',
+                chunkTexts,
+                (src + "\n").splitlines()[errline-1],
+                errline
+            ))
+        if chunkKinds:
+            kinds.append(chunkKinds)
+            texts.extend(chunkTexts.split("\0"))
+    return TokenStream(src, b"".join(kinds), texts)
+
+# A Lexer, or for big sources a stream lexed in parallel. jobs=None picks
+# all cores once the source is at least PARALLEL_MIN_SIZE characters long.
+def makeLexer(src: str, jobs: int = None):
+    if jobs is None:
+        jobs = (os.cpu_count() or 1) if len(src) >= PARALLEL_MIN_SIZE else 1
+    elif jobs == 0:
+        jobs = os.cpu_count() or 1
+    if jobs <= 1:
+        return Lexer(src)
+    return lexParallel(src, jobs)
@@ -33,14 +33,16 @@
 from . import tools
 from .errors.rterror import RuntimeError
 from .lex import Lexer, TokType
-from .emit import Emitter
+from . import nodes
+from .parallel import checkParallel
 
 class Parser:
-    def __init__(self, lexer: Lexer, emitter: Emitter) -> None:
+    def __init__(self, lexer: Lexer) -> None:
         self.lexer: Lexer = lexer
-        self.emitter: Emitter = emitter
 
-        self.vars: set = set()        # Variables declared so far.
+        self.vars: dict = {}          # Variables declared so far, with their types.
+        self.subs: dict = {}          # SUBs defined so far, by name.
+        self.depth: int = 0           # Statement lists being parsed, 1 at the top level.
         self.curToken: str = None
         self.peekToken: str = None
         self.nextToken()
@@ -65,12 +67,13 @@ class Parser:
         self.curToken = self.peekToken
         self.peekToken = self.lexer.getToken()
 
-    def abort(self, message) -> None:
+    def abort(self, message, lineno: int = None, errname: str = "ParseError") -> None:
+        lineno = lineno or self.lexer.lineno
         tools.throwError(RuntimeError(
-            "ParseError",
+            errname,
             message,
-            self.lexer.src_lines[self.lexer.lineno-1],
-            self.lexer.lineno
+            self.lexer.src_lines[lineno-1],
+            lineno
         ))
     
     # Return true if the current token is a comparison operator.
@@ -87,121 +90,136 @@ class Parser:
                self.checkToken(TokType.INT) or \
                self.checkToken(TokType.REAL) or \
                self.checkToken(TokType.STR)
+
+    def checkDeclared(self) -> None:
+        if self.curToken.text not in self.vars:
+            self.abort(f"Referencing variable before declaration: {self.curToken.text}")
+
+    # Parses statements until one of the given tokens
+    def block(self, *ends: TokType) -> list:
+        body: list = []
+        self.depth += 1
+        while not any(self.checkToken(kind) for kind in ends):
+            body.append(self.statement())
+        self.depth -= 1
+        return body
     
-    def parseIF(self, type="") -> None:
-        if type == "elsif":
-            self.match(TokType.ELSIF)
-            self.emitter.emit("}else ")
+    # Parses the arms of an IF iteratively, so long ELSIF chains don't recurse
+    def parseIF(self) -> nodes.If:
+        node: nodes.If = nodes.If([])
 
-        self.emitter.emit("if(")
-        self.comparison()
-        self.match(TokType.THEN)
-        self.nl()
-        self.emitter.emitLine("){")
+        while True:
+            cond: nodes.Compare = self.comparison()
+            self.match(TokType.THEN)
+            self.nl()
+            node.arms.append((cond, self.block(TokType.ELSE, TokType.END, TokType.ELSIF)))
 
-        while not (self.checkToken(TokType.ELSE) or self.checkToken(TokType.END) or self.checkToken(TokType.ELSIF)):
-            self.statement()
+            if not self.checkToken(TokType.ELSIF):
+                break
+            self.match(TokType.ELSIF)
         
         if self.checkToken(TokType.ELSE):
             self.match(TokType.ELSE)
-            self.emitter.emit("} else ")
             self.nl()
-            self.emitter.emitLine("{")
-            while not self.checkToken(TokType.END):
-                self.statement()
-        
-        if self.checkToken(TokType.ELSIF):
-            self.parseIF("elsif")
+            node.orelse = self.block(TokType.END)
+
+        return node
+
+    def parseFOR(self, parallel: bool = False) -> nodes.For:
+        ctr: str = self.curToken.text
+        self.checkDeclared()
+        self.match(TokType.IDENTIFIER)
+        self.match(TokType.COLONEQ)
+        start: nodes.Node = self.expression()
+
+        self.match(TokType.TO)
+        end: nodes.Node = self.expression()
+
+        self.match(TokType.BY)
+        step: nodes.Node = self.expression()
+
+        reductions: list = []
+        while parallel and self.checkToken(TokType.REDUCE):
+            self.nextToken()
+            if not (self.checkToken(TokType.PLUS) or self.checkToken(TokType.ASTERISK) or \
+                    self.curToken.text in ["min", "max"]):
+                self.abort(f"Expected reduction operator (+, *, min, max) at: {self.curToken.text}")
+            op: str = self.curToken.text
+            self.nextToken()
+            self.checkDeclared()
+            reductions.append((op, self.curToken.text))
+            self.match(TokType.IDENTIFIER)
+
+        self.match(TokType.DO)
+        self.nl()
+
+        node: nodes.For = nodes.For(ctr, start, end, step, self.block(TokType.END), parallel, reductions)
+
+        self.match(TokType.END)
+        return node
 
     # Grammar Parsing Rules (see Calci.g for rules)
 
     # Calci.g => rule program:
-    def program(self) -> None:
-        self.emitter.headerLine("#include <stdio.h>")
-        self.emitter.headerLine("int main(void){")
-
+    def program(self) -> nodes.Program:
         while self.checkToken(TokType.NEWLINE):
             self.nextToken()
 
-        while not self.checkToken(TokType.EOF):
-            self.statement()
-        
-        self.emitter.emitLine("return 0;")
-        self.emitter.emitLine("}")
+        body: list = self.block(TokType.EOF)
+        return nodes.Program(body, self.vars)
     
     # Calci.g => rule statement:
-    def statement(self) -> None:
-        # Calci.g => Subrule {1}
-        if self.checkToken(TokType.PRINT):
-            self.nextToken()
+    def statement(self) -> nodes.Node:
+        lineno: int = self.lexer.lineno
+        node: nodes.Node = None
 
-            if self.checkToken(TokType.STRING):
-                self.emitter.emitLine(f"printf(\"{self.curToken.text}\");")
-                self.nextToken() # String
-            else:
-                self.emitter.emit(f"printf(\"{tools.gencFmt(self.curToken.text)}\",")
-                self.nextToken()
-                self.expression() # Expression
-                self.emitter.emitLine(");")
-        
-        # Calci.g => Subrule {2}
-        elif self.checkToken(TokType.PRINTLN):
+        # Calci.g => Subrule {1} and {2}
+        if self.checkToken(TokType.PRINT) or self.checkToken(TokType.PRINTLN):
+            newline: bool = self.checkToken(TokType.PRINTLN)
             self.nextToken()
 
             if self.checkToken(TokType.STRING):
-                self.emitter.emitLine(f"printf(\"{self.curToken.text}\");")
+                node = nodes.PrintText(self.curToken.text, newline)
                 self.nextToken() # String
             else:
-                self.emitter.emit(f"printf(\"{tools.gencFmt(self.curToken.text)}\",")
+                vtype: str = self.curToken.text
                 self.nextToken()
-                self.expression() # Expression
-                self.emitter.emitLine(");")
-            self.emitter.emitLine("printf(\"\\n\");")
+                node = nodes.Print(vtype, self.expression(), newline) # Expression
         
         # Calci.g => Subrule {3}
         elif self.checkToken(TokType.FMTPRINT):
             self.nextToken()
-            self.emitter.emit(f"printf(\"{self.curToken.text}\"")
+            fmt: str = self.curToken.text
 
             fmt_vars: list[str] = []
             self.nextToken()
 
             while not self.checkToken(TokType.NEWLINE):
-                if self.curToken.text not in self.vars:
-                    self.abort(f"Referencing variable before declaration: {self.curToken.text}")
-                    
+                self.checkDeclared()
                 fmt_vars.append(self.curToken.text)
                 self.match(TokType.IDENTIFIER)
             
-            for fvars in fmt_vars:
-                self.emitter.emit(f", {fvars}")
-            
-            self.emitter.emitLine(");")
+            node = nodes.FmtPrint(fmt, fmt_vars)
         
         # Calci.g => Subrule {4}
         elif self.checkToken(TokType.INPUT):
             self.nextToken()
-            fmt = tools.gencFmt(self.curToken.text, "i")
+            vtype: str = self.curToken.text
             self.nextToken()
 
-            if self.curToken.text not in self.vars:
-                self.abort(f"Referencing variable before declaration: {self.curToken.text}")
-            
-            self.emitter.emitLine(f"scanf(\"{fmt}\", &{self.curToken.text});")
+            self.checkDeclared()
+            node = nodes.Input(vtype, self.curToken.text)
             self.match(TokType.IDENTIFIER)
         
         # Calci.g => Subrule {5}
         elif self.checkToken(TokType.VAR):
             self.nextToken()
 
-            if self.curToken.text not in self.vars:
-                self.abort(f"Referencing variable before declaration: {self.curToken.text}")
-            
-            self.emitter.emit(self.curToken.text + " = ")
+            self.checkDeclared()
+            name: str = self.curToken.text
             self.match(TokType.IDENTIFIER)
             self.match(TokType.COLONEQ)
-            self.expression()
-            self.emitter.emitLine(";")
+            node = nodes.Assign(name, self.expression())
         
         # Calci.g => Subrule {6}
         elif self.checkToken(TokType.LET):
@@ -209,9 +227,7 @@ class Parser:
             self.nextToken()
 
             while not self.checkToken(TokType.COLON):
-                if self.curToken.text not in self.vars:
-                    self.vars.add(self.curToken.text)
-                else:
+                if self.curToken.text in self.vars or self.curToken.text in vars_decl:
                     self.abort(f"Redeclaring variable: {self.curToken.text}")
 
                 vars_decl.append(self.curToken.text)
@@ -220,8 +236,9 @@ class Parser:
             
             self.match(TokType.COLON)
             if self.isType():
-                vals = ",".join(vars_decl)
-                self.emitter.headerLine(f"{tools.getcType(self.curToken.text)} {vals};")
+                for name in vars_decl:
+                    self.vars[name] = self.curToken.text
+                node = nodes.Let(vars_decl, self.curToken.text)
                 self.nextToken()
             else:
                 self.abort(f"Expected type name at: {self.curToken.text}")
@@ -229,121 +246,126 @@ class Parser:
         # Calci.g => Subrule {7}
         elif self.checkToken(TokType.IF):
             self.nextToken()
-            self.parseIF()
+            node = self.parseIF()
 
             self.match(TokType.END)
-            self.emitter.emitLine("}")
         
         # Calci.g => Subrule {8}
         elif self.checkToken(TokType.WHILE):
             self.nextToken()
-            self.emitter.emit("while(")
-            self.comparison()
+            cond: nodes.Compare = self.comparison()
 
             self.match(TokType.REPEAT)
             self.nl()
-            self.emitter.emitLine("){")
-
-            while not self.checkToken(TokType.END):
-                self.statement()
+            node = nodes.While(cond, self.block(TokType.END))
             
             self.match(TokType.END)
-            self.emitter.emitLine("}")
         
         # Calci.g => Subrule {9}
         elif self.checkToken(TokType.FOR):
             self.nextToken()
-            self.emitter.emit("for(")
-            ctr: str = self.curToken.text
-            if self.curToken.text not in self.vars:
-                self.abort(f"Referencing variable before declaration: {self.curToken.text}")
+            node = self.parseFOR()
+
+        # Calci.g => Subrule {10}
+        elif self.checkToken(TokType.PARALLEL):
+            self.nextToken()
+            self.match(TokType.FOR)
+            node = self.parseFOR(parallel=True)
+
+            # The check and OpenMP both need to see what the CALLs in the body do
+            node.body = nodes.expandCalls(node.body, self.subs)
+            error: str = checkParallel(node, self.vars)
+            if error is not None:
+                self.abort(error, lineno, "ParallelError")
+
+        # Calci.g => Subrule {11}
+        elif self.checkToken(TokType.SUB):
+            if self.depth > 1:
+                self.abort("SUB can only be defined at the top level")
+            self.nextToken()
+
+            name: str = self.curToken.text
+            if name in self.subs:
+                self.abort(f"Redefining subroutine: {name}")
             self.match(TokType.IDENTIFIER)
-            self.match(TokType.COLONEQ)
-            self.emitter.emit(ctr + " = ")
-            self.expression()
-            self.emitter.emit(";")
-
-            self.match(TokType.TO)
-            self.emitter.emit(ctr + "<")
-            self.expression()
-            self.emitter.emit(";")
-
-            self.match(TokType.BY)
-            self.emitter.emit(ctr + "+=")
-            self.expression()
-            self.match(TokType.DO)
             self.nl()
-            self.emitter.emitLine("){")
-
-            while not self.checkToken(TokType.END):
-                self.statement()
+            node = nodes.Sub(name, self.block(TokType.END))
+            self.subs[name] = node    # Only after the body, so a SUB can't call itself
 
             self.match(TokType.END)
-            self.emitter.emitLine("}")
 
-        
+        # Calci.g => Subrule {12}
+        elif self.checkToken(TokType.CALL):
+            self.nextToken()
+
+            if self.curToken.text not in self.subs:
+                self.abort(f"Calling subroutine before definition: {self.curToken.text}")
+            node = nodes.Call(self.curToken.text)
+            self.match(TokType.IDENTIFIER)
+
         else:
             self.abort(f"Invalid statement at {self.curToken.text} ({self.curToken.kind})")
             
         # Newline
         self.nl()
+        node.lineno = lineno
+        return node
     
     # Calci.g => rule comparison:
-    def comparison(self) -> None:
-        self.expression()
-        if self.isComparisonOperator():
-            if self.checkToken(TokType.EQ):
-                self.curToken.text = "=="
-            self.emitter.emit(self.curToken.text)
-            self.nextToken()
-            self.expression()
-        else:
+    def comparison(self) -> nodes.Compare:
+        first: nodes.Node = self.expression()
+        rest: list = []
+        if not self.isComparisonOperator():
             self.abort(f"Expected comparison operator at: {self.curToken.text}")
 
         while self.isComparisonOperator():
-            self.emitter.emit(self.curToken.text)
+            op: str = "==" if self.checkToken(TokType.EQ) else self.curToken.text
             self.nextToken()
-            self.expression()
+            rest.append((op, self.expression()))
+        return nodes.Compare(first, rest)
     
     # Calci.g => rule expression:
-    def expression(self) -> None:
-        self.term()
-        # Can have 0 or more +/-/% and expressions.
-        while self.checkToken(TokType.PLUS) or self.checkToken(TokType.MINUS) or self.checkToken(TokType.MODSIGN):
-            self.emitter.emit(self.curToken.text)
+    def expression(self) -> nodes.Node:
+        node: nodes.Node = self.term()
+        # Can have 0 or more +/- and expressions.
+        while self.checkToken(TokType.PLUS) or self.checkToken(TokType.MINUS):
+            op: str = self.curToken.text
             self.nextToken()
-            self.term()
+            node = nodes.BinOp(op, node, self.term())
+        return node
     
     # Calci.g => rule term:
-    def term(self) -> None:
-        self.unary()
-        # Can have 0 or more *// and expressions.
-        while self.checkToken(TokType.ASTERISK) or self.checkToken(TokType.SLASH):
-            self.emitter.emit(self.curToken.text)
+    def term(self) -> nodes.Node:
+        node: nodes.Node = self.unary()
+        # Can have 0 or more *,/,% and expressions.
+        while self.checkToken(TokType.ASTERISK) or self.checkToken(TokType.SLASH) or self.checkToken(TokType.MODSIGN):
+            op: str = self.curToken.text
             self.nextToken()
-            self.unary()
+            node = nodes.BinOp(op, node, self.unary())
+        return node
     
     # Calci.g => rule unary:
-    def unary(self) -> None:
+    def unary(self) -> nodes.Node:
         # Optional unary +/-
         if self.checkToken(TokType.PLUS) or self.checkToken(TokType.MINUS):
-            self.emitter.emit(self.curToken.text)
+            op: str = self.curToken.text
             self.nextToken()        
-        self.primary()
+            return nodes.UnaryOp(op, self.primary())
+        return self.primary()
     
     # Calci.g => rule primary:
-    def primary(self) -> None:
+    def primary(self) -> nodes.Node:
         if self.checkToken(TokType.NUMBER):
-            self.emitter.emit(self.curToken.text)
+            node: nodes.Node = nodes.Number(self.curToken.text)
             self.nextToken()
         elif self.checkToken(TokType.IDENTIFIER):
-            if self.curToken.text not in self.vars:
-                self.abort(f"Referencing variable before declaration: {self.curToken.text}")
-            self.emitter.emit(self.curToken.text)
+            self.checkDeclared()
+            node: nodes.Node = nodes.Ident(self.curToken.text)
             self.nextToken()
         else:
             # Error!
             self.abort(f"Unexpected token at {self.curToken.text}")
+        return node
     
     # Calci.g => rule nl:
     def nl(self) -> None:
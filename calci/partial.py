@@ -0,0 +1,327 @@
+# The Calci Programming language partial evaluator
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Runs the start of a program in the compiler, as far as it gets without INPUT
+# and within a budget. What that part prints becomes literal output, and the
+# rest of the program starts from the variable values it left behind.
+
+import math, re
+from . import nodes
+from .lower import numberNode
+from .parallel import readsOf
+
+PARTIAL_STEPS: int = 1000000      # Statements, loop iterations and operations run at compile time at most,
+PARTIAL_OUTPUT: int = 1 << 20     # printing at most this many characters.
+
+INT_MIN: int = -2**31
+INT_MAX: int = 2**31 - 1
+NAT_MOD: int = 2**32
+
+FORMAT_SPEC = re.compile(r"%(%|l?[diuf])")
+UNSET: object = object()          # Undo log entry of a variable that had no value
+
+# Raised when a statement can't be run at compile time, it is left to the program
+class Residual(Exception):
+    pass
+
+# Calci type two operands are converted to, following C's usual arithmetic conversions
+def commonType(left: str, right: str) -> str:
+    for vtype in ["real", "nat"]:
+        if vtype in [left, right]:
+            return vtype
+    return "int"
+
+# Converts a (type, value) pair as C does on assignment
+def convert(value: tuple, vtype: str):
+    src, number = value
+    if vtype == "real":
+        return float(number)
+    if vtype not in ["int", "nat"]:
+        raise Residual()
+    if src == "real":
+        number = math.trunc(number)
+        if not (0 if vtype == "nat" else INT_MIN) <= number <= (NAT_MOD - 1 if vtype == "nat" else INT_MAX):
+            raise Residual()      # Undefined in C
+        return number
+    if vtype == "nat":
+        return number % NAT_MOD
+    return number - NAT_MOD if number > INT_MAX else number
+
+def arith(op: str, left: tuple, right: tuple) -> tuple:
+    vtype: str = commonType(left[0], right[0])
+    a = convert(left, vtype)
+    b = convert(right, vtype)
+    if op in ["/", "%"] and b == 0:
+        raise Residual()
+    if vtype == "real":
+        if op == "%":
+            raise Residual()
+        result = {"+": a + b, "-": a - b, "*": a * b}[op] if op != "/" else a / b
+        if not math.isfinite(result):
+            raise Residual()
+        return ("real", result)
+
+    if op == "+":
+        result: int = a + b
+    elif op == "-":
+        result: int = a - b
+    elif op == "*":
+        result: int = a * b
+    else:
+        quotient: int = abs(a) // abs(b) * (-1 if (a < 0) != (b < 0) else 1)
+        result: int = quotient if op == "/" else a - b * quotient
+    if vtype == "nat":
+        return ("nat", result % NAT_MOD)
+    if not INT_MIN <= result <= INT_MAX:
+        raise Residual()          # Signed overflow
+    return ("int", result)
+
+def compare(op: str, left: tuple, right: tuple) -> bool:
+    vtype: str = commonType(left[0], right[0])
+    a = convert(left, vtype)
+    b = convert(right, vtype)
+    return {"<": a < b, "<=": a <= b, ">": a > b, ">=": a >= b, "==": a == b, "!=": a != b}[op]
+
+# Text the runtime prints for a value of the given type
+def formatValue(vtype: str, value) -> str:
+    if vtype == "nat":
+        return str(convert(("nat", value), "int"))    # Printed through %d
+    return "%f" % value if vtype == "real" else str(value)
+
+class PartialEvaluator:
+    def __init__(self, program: nodes.Program) -> None:
+        self.program: nodes.Program = program
+        self.vars: dict = program.vars
+        self.values: dict = {}        # Variable -> value, for the variables assigned so far
+        self.subs: dict = {}          # SUBs by name
+        self.output: list = []        # PrintText nodes of what has been printed
+        self.outputLen: int = 0
+        self.steps: int = 0
+        self.undo: dict = {}          # Variable -> value before the running top level statement, for the ones it assigned
+
+    # Runs the top level statements one by one until one of them can't be run,
+    # and returns the program doing what is left. The budget counts steps, not
+    # time, so the same source always gives the same program.
+    def run(self) -> nodes.Program:
+        body: list = self.program.body
+        done: int = 0
+        for stmt in body:
+            self.undo = {}
+            printed: int = len(self.output)
+            outputLen: int = self.outputLen
+            try:
+                self.statement(stmt)
+            except Residual:
+                # SUBs need no undoing, a SUB statement can't fail once its SUB is defined
+                for name, value in self.undo.items():
+                    if value is UNSET:
+                        del self.values[name]
+                    else:
+                        self.values[name] = value
+                del self.output[printed:]
+                self.outputLen = outputLen
+                break
+            done += 1
+
+        if all(isinstance(stmt, (nodes.Let, nodes.Sub)) for stmt in body[:done]):
+            return self.program
+
+        kept: list = []               # Declarations of the part that ran
+        for stmt in body[:done]:
+            if isinstance(stmt, nodes.Sub):
+                kept.append(stmt)
+            else:
+                kept.extend(inner for inner in nodes.walk([stmt]) if isinstance(inner, nodes.Let))
+        rest: list = body[done:]
+        restored: list = []
+        if rest:
+            for name, value in self.values.items():
+                restored.append(nodes.Assign(name, self.valueNode(value)))
+                restored[-1].lineno = rest[0].lineno
+        self.program.body = kept + self.output + restored + rest
+        return self.program
+
+    def valueNode(self, value) -> nodes.Node:
+        if isinstance(value, int):
+            return numberNode(value)
+        if math.copysign(1.0, value) < 0:
+            return nodes.UnaryOp("-", nodes.Number(repr(-value)))
+        return nodes.Number(repr(value))
+
+    # Counts a statement, loop iteration or operation against the budget
+    def tick(self) -> None:
+        self.steps += 1
+        if self.steps > PARTIAL_STEPS:
+            raise Residual()
+
+    def write(self, text: str, newline: bool) -> None:
+        self.outputLen += len(text) + newline
+        if self.outputLen > PARTIAL_OUTPUT:
+            raise Residual()
+        self.output.append(nodes.PrintText(text, newline))
+
+    def body(self, body: list) -> None:
+        for stmt in body:
+            self.statement(stmt)
+
+    def statement(self, stmt: nodes.Node) -> None:
+        self.tick()
+
+        if isinstance(stmt, nodes.PrintText):
+            self.write(stmt.text, stmt.newline)
+
+        elif isinstance(stmt, nodes.Print):
+            self.write(formatValue(stmt.vtype, convert(self.expression(stmt.value), stmt.vtype)), stmt.newline)
+
+        elif isinstance(stmt, nodes.FmtPrint):
+            self.write(self.format(stmt), False)
+
+        elif isinstance(stmt, nodes.Assign):
+            self.assign(stmt.name, self.expression(stmt.value))
+
+        elif isinstance(stmt, nodes.Let):
+            pass
+
+        elif isinstance(stmt, nodes.If):
+            for cond, body in stmt.arms:
+                if self.expression(cond)[1]:
+                    self.body(body)
+                    return
+            if stmt.orelse is not None:
+                self.body(stmt.orelse)
+
+        elif isinstance(stmt, nodes.While):
+            while self.expression(stmt.cond)[1]:
+                self.tick()
+                self.body(stmt.body)
+
+        elif isinstance(stmt, nodes.For):
+            self.loopFor(stmt)
+
+        elif isinstance(stmt, nodes.Sub):
+            self.subs[stmt.name] = stmt
+
+        elif isinstance(stmt, nodes.Call):
+            self.body(self.subs[stmt.name].body)
+
+        else:
+            raise Residual()          # INPUT
+
+    # Same steps as the loop lowerFor builds: the end and step are evaluated
+    # once after the counter is set, and the step's sign picks the test.
+    def loopFor(self, stmt: nodes.For) -> None:
+        if stmt.parallel and stmt.ctr in readsOf(stmt.end):
+            raise Residual()          # OpenMP builds evaluate the end before setting the counter
+        self.assign(stmt.ctr, self.expression(stmt.start))
+        end: tuple = self.expression(stmt.end)
+        step: tuple = self.expression(stmt.step)
+        down: bool = step[1] < 0      # The step doesn't change, nor does its sign
+        while compare(">" if down else "<", self.variable(stmt.ctr), end):
+            self.tick()
+            self.body(stmt.body)
+            self.assign(stmt.ctr, arith("+", self.variable(stmt.ctr), step))
+
+    def assign(self, name: str, value: tuple) -> None:
+        if name not in self.undo:
+            self.undo[name] = self.values.get(name, UNSET)
+        self.values[name] = convert(value, self.vars[name])
+
+    def variable(self, name: str) -> tuple:
+        if name not in self.values or self.vars[name] == "str":
+            raise Residual()          # Not assigned yet, or set by INPUT
+        return (self.vars[name], self.values[name])
+
+    def expression(self, expr: nodes.Node) -> tuple:
+        if isinstance(expr, nodes.Number):
+            if "." in expr.text:
+                return ("real", float(expr.text))
+            if int(expr.text) > INT_MAX:
+                raise Residual()      # A long in C
+            return ("int", int(expr.text))
+
+        if isinstance(expr, nodes.Ident):
+            return self.variable(expr.name)
+
+        if isinstance(expr, nodes.UnaryOp):
+            value: tuple = self.expression(expr.operand)
+            if expr.op == "+":
+                return value
+            return ("real", -value[1]) if value[0] == "real" else arith("-", (value[0], 0), value)
+
+        if isinstance(expr, nodes.BinOp):
+            self.tick()
+            return arith(expr.op, self.expression(expr.left), self.expression(expr.right))
+
+        if isinstance(expr, nodes.Compare):
+            left: tuple = self.expression(expr.first)
+            for op, operand in expr.rest:
+                self.tick()
+                left = ("int", int(compare(op, left, self.expression(operand))))
+            return left
+
+        raise Residual()
+
+    # Output of a FMTPRINT. The text stays escaped as in the source, only
+    # conversions printf would do the same way everywhere are done here.
+    def format(self, stmt: nodes.FmtPrint) -> str:
+        pieces: list = []
+        names = iter(stmt.names)
+        index: int = 0
+        while index < len(stmt.fmt):
+            char: str = stmt.fmt[index]
+            if char == "\\":
+                pieces.append(stmt.fmt[index:index + 2])
+                index += 2
+                continue
+            if char != "%":
+                pieces.append(char)
+                index += 1
+                continue
+            spec = FORMAT_SPEC.match(stmt.fmt, index)
+            if spec is None:
+                raise Residual()
+            index = spec.end()
+            conv: str = spec.group(1)[-1]
+            if conv == "%":
+                pieces.append("%")
+                continue
+            name: str = next(names, None)
+            if name is None:
+                raise Residual()
+            value: tuple = self.variable(name)
+            if (conv == "f") != (value[0] == "real"):
+                raise Residual()      # Undefined in C
+            pieces.append(formatValue(value[0], value[1]) if conv == "f" else
+                          str(convert(value, "nat" if conv == "u" else "int")))
+        text: str = "".join(pieces)
+        if "%%" in text:
+            raise Residual()          # Would print as a single % through PRINT
+        return text
@@ -0,0 +1,135 @@
+# The Calci Programming language profile-guided builds
+#
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Builds a program instrumented, runs it on a training input, and builds it
+# again optimized for the branches and loops that run showed to be hot. The
+# profile is cached under the build key (compiler, flags and C source) and
+# the training input, so rebuilding the same program skips the training run.
+
+import hashlib, os, shutil, subprocess, time
+from .errors.comperror import CompilerError
+from . import tools
+
+PGO_FLAGS: str = "-O2"
+TIMING_RUNS: int = 3          # The speedup compares the best of this many runs of each build
+
+def cacheRoot() -> str:
+    return os.getenv("CALCI_CACHE", os.path.join(os.path.expanduser("~"), ".cache", "calci"))
+
+def digest(*parts: bytes) -> str:
+    sha = hashlib.sha256()
+    for part in parts:
+        sha.update(hashlib.sha256(part).digest())
+    return sha.hexdigest()
+
+def pgoError(message: str) -> None:
+    tools.throwError(CompilerError("PGOError", message))
+
+# Compiles and links in two steps, so the profile is named after prog.o in
+# every build and the optimized build finds what the instrumented one wrote
+def build(cc: str, flags: str, workdir: str, exe: str) -> None:
+    obj: str = os.path.join(workdir, "prog.o")
+    src: str = os.path.join(workdir, "prog.c")
+    if os.system(f"{cc} {flags} -c {src} -o {obj}") != 0 or \
+       os.system(f"{cc} {flags} {obj} -o {exe}") != 0:
+        pgoError(f"Cannot build {os.path.basename(exe)} with {cc} {flags}")
+
+# Best wall time of the program over the training input
+def timeRun(exe: str, training: str) -> float:
+    best: float = None
+    for _ in range(TIMING_RUNS):
+        with open(training, "rb") as stdin:
+            start: float = time.perf_counter()
+            subprocess.run([exe], stdin=stdin, stdout=subprocess.DEVNULL)
+            elapsed: float = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+# Runs the instrumented build on the training input, leaving the profile at `profile`
+def train(cc: str, flags: str, workdir: str, training: str, profile: str) -> None:
+    clang: bool = tools.ccFamily(cc) == "clang"
+    rawdir: str = os.path.join(workdir, "raw")
+    shutil.rmtree(rawdir, ignore_errors=True)
+    if os.path.exists(profile):
+        os.remove(profile)            # gcc would add the new counts to the old ones
+
+    instrumented: str = os.path.join(workdir, "prog-gen")
+    build(cc, f"{flags} -fprofile-generate={rawdir}" if clang else
+          f"{flags} -fprofile-generate -fprofile-update=atomic", workdir, instrumented)
+    with open(training, "rb") as stdin:
+        subprocess.run([instrumented], stdin=stdin, stdout=subprocess.DEVNULL, cwd=workdir)
+    if clang and os.path.isdir(rawdir):
+        raws: list = [os.path.join(rawdir, name) for name in os.listdir(rawdir) if name.endswith(".profraw")]
+        if raws:
+            subprocess.run(["llvm-profdata", "merge", "-output=" + profile] + raws)
+    if not os.path.exists(profile):
+        pgoError("The instrumented program did not write profile data")
+
+def pgoBuild(cc: str, cfname: str, exe: str, training: str) -> None:
+    family: str = tools.ccFamily(cc)
+    if family not in ["gcc", "clang"]:
+        pgoError(f"Profile-guided builds need gcc or clang, $CC is {cc}")
+    if family == "clang" and not shutil.which("llvm-profdata"):
+        pgoError("llvm-profdata was not found")
+    if not os.path.isfile(training):
+        pgoError(f"Cannot open training input {training}")
+
+    flags: str = PGO_FLAGS + tools.cFlags(cc, cfname)
+    with open(cfname, "rb") as cfile:
+        source: bytes = cfile.read()
+    with open(training, "rb") as trainfile:
+        trainKey: str = digest(trainfile.read())
+
+    # Builds happen in the cache directory of the key, as gcc checks that the
+    # profile comes from a build of the same file at the same path
+    workdir: str = os.path.join(cacheRoot(), digest(cc.encode(), flags.encode(), source))
+    os.makedirs(workdir, exist_ok=True)
+    shutil.copyfile(cfname, os.path.join(workdir, "prog.c"))
+    profile: str = os.path.join(workdir, "prog.gcda" if family == "gcc" else "prog.profdata")
+    cached: str = os.path.join(workdir, f"{trainKey}-{os.path.basename(profile)}")
+
+    if os.path.exists(cached):
+        shutil.copyfile(cached, profile)
+        print(f"Reusing the profile in {workdir}")
+    else:
+        train(cc, flags, workdir, training, profile)
+        shutil.copyfile(profile, cached)
+
+    use: str = f"-fprofile-use={profile}" if family == "clang" else "-fprofile-use -fprofile-correction"
+    build(cc, f"{flags} {use}", workdir, exe)
+    plain: str = os.path.join(workdir, "prog-plain")
+    build(cc, flags, workdir, plain)
+
+    withPGO: float = timeRun(os.path.abspath(exe), training)
+    without: float = timeRun(plain, training)
+    print(f"PGO build: {withPGO:.4f}s on the training input, {without:.4f}s without PGO "
+          f"({without / max(withPGO, 1e-9):.2f}x)")
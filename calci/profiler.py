@@ -0,0 +1,90 @@
+# Calci Language profiler
+#
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+import os, re, shutil, subprocess, sys, tempfile
+from .errors.comperror import CompilerError
+from . import tools
+
+# A line of gprof's line-level flat profile, e.g.
+#  60.00      0.03     0.03                             main (prog.ca:12 @ 401136)
+GPROF_LINE: re.Pattern = re.compile(r"^\s*[\d.]+\s+[\d.]+\s+([\d.]+)\s.*\((.+):(\d+) @ [0-9a-fA-F]+\)\s*$")
+TOP_LINES: int = 15
+
+# gprof needs a gcc compatible compiler that understands -pg
+def profilingCC() -> str:
+    cc: str = tools.getCC()
+    if tools.ccFamily(cc) in ["gcc", "clang"]:
+        return cc
+    if shutil.which("gcc"):
+        return "gcc"
+    tools.throwError(CompilerError(
+        "ProfileError",
+        f"Profiling needs gcc or clang with gprof, $CC is {cc}"
+    ))
+
+# Seconds spent on each line of the Calci source, from gprof -l output
+def lineTimes(report: str, srcname: str) -> dict:
+    times: dict = {}
+    for line in report.splitlines():
+        found: re.Match = GPROF_LINE.match(line)
+        if found and os.path.basename(found.group(2)) == srcname:
+            lineno: int = int(found.group(3))
+            times[lineno] = times.get(lineno, 0.0) + float(found.group(1))
+    return times
+
+def profileProgram(cfname: str, fname: str, srclines: list) -> None:
+    cc: str = profilingCC()
+    if not shutil.which("gprof"):
+        tools.throwError(CompilerError("ProfileError", "gprof was not found"))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        exe: str = os.path.join(tmpdir, "prog")
+        if os.system(f"{cc}{tools.cFlags(cc, cfname)} -g -pg -fno-inline {cfname} -o {exe}") != 0:
+            tools.throwError(CompilerError("ProfileError", f"Cannot build {cfname} for profiling"))
+
+        subprocess.run([exe], cwd=tmpdir)
+        if not os.path.exists(os.path.join(tmpdir, "gmon.out")):
+            tools.throwError(CompilerError("ProfileError", "The program did not write profile data"))
+        report: str = subprocess.run(["gprof", "-b", "-l", exe, "gmon.out"], cwd=tmpdir,
+                                     capture_output=True, text=True).stdout
+
+    times: dict = lineTimes(report, os.path.basename(fname))
+    total: float = sum(times.values())
+    sys.stdout.flush()
+    print(f"\nCalci profile of {fname}: {total:.2f}s sampled")
+    if not times:
+        print("No samples landed in the program, it ran too briefly to profile")
+        return
+    print(f"{'time%':>7} {'seconds':>9} {'line':>6}  source")
+    for lineno, seconds in sorted(times.items(), key=lambda item: -item[1])[:TOP_LINES]:
+        source: str = srclines[lineno-1].strip() if lineno <= len(srclines) else ""
+        print(f"{100 * seconds / total:7.2f} {seconds:9.2f} {lineno:6}  {source}")
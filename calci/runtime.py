@@ -0,0 +1,354 @@
+# The Calci Programming language C runtime
+#
+# BSD 3-Clause License
+# 
+# Copyright (c) 2022, Harish Kumar
+# All rights reserved.
+# 
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+# 
+# 1. Redistributions of source code must retain the above copyright notice, this
+#    list of conditions and the following disclaimer.
+# 
+# 2. Redistributions in binary form must reproduce the above copyright notice,
+#    this list of conditions and the following disclaimer in the documentation
+#    and/or other materials provided with the distribution.
+# 
+# 3. Neither the name of the copyright holder nor the names of its
+#    contributors may be used to endorse or promote products derived from
+#    this software without specific prior written permission.
+# 
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE ARE
+# DISCLAIMED. IN NO EVENT SHALL THE COPYRIGHT HOLDER OR CONTRIBUTORS BE LIABLE
+# FOR ANY DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL
+# DAMAGES (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR
+# SERVICES; LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER
+# CAUSED AND ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY,
+# OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
+# OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+# Runtime support code emitted into the header of generated C programs.
+# Each chunk is included at most once, and only when the program uses it.
+
+OUTPUT: str = r"""#include <stdio.h>
+#include <string.h>
+#include <stdarg.h>
+
+#define CALCI_OBUFSZ 65536
+#define calci_lit(s) calci_write(s, sizeof(s) - 1)
+
+static char calci_obuf[CALCI_OBUFSZ];
+static size_t calci_opos = 0;
+
+static void calci_flush(void){
+    if(calci_opos){
+        fwrite(calci_obuf, 1, calci_opos, stdout);
+        calci_opos = 0;
+    }
+    fflush(stdout);
+}
+
+static void calci_write(const char *s, size_t n){
+    if(n > CALCI_OBUFSZ - calci_opos){
+        calci_flush();
+        if(n > CALCI_OBUFSZ){
+            fwrite(s, 1, n, stdout);
+            return;
+        }
+    }
+    memcpy(calci_obuf + calci_opos, s, n);
+    calci_opos += n;
+}
+
+static void calci_fmt(const char *fmt, ...){
+    va_list ap;
+    int n;
+    va_start(ap, fmt);
+    n = vsnprintf(calci_obuf + calci_opos, CALCI_OBUFSZ - calci_opos, fmt, ap);
+    va_end(ap);
+    if(n < 0) return;
+    if((size_t)n < CALCI_OBUFSZ - calci_opos){
+        calci_opos += n;
+        return;
+    }
+    calci_flush();
+    va_start(ap, fmt);
+    if((size_t)n < CALCI_OBUFSZ){
+        vsnprintf(calci_obuf, CALCI_OBUFSZ, fmt, ap);
+        calci_opos = n;
+    }else{
+        vfprintf(stdout, fmt, ap);
+    }
+    va_end(ap);
+}
+
+static void calci_putull(unsigned long long v){
+    char tmp[20];
+    int n = 0;
+    if(CALCI_OBUFSZ - calci_opos < sizeof(tmp)) calci_flush();
+    do{
+        tmp[n++] = '0' + v % 10;
+        v /= 10;
+    }while(v);
+    while(n) calci_obuf[calci_opos++] = tmp[--n];
+}
+
+static void calci_puti(int v){
+    if(v < 0){
+        calci_lit("-");
+        calci_putull(0ULL - (unsigned long long)(long long)v);
+    }else{
+        calci_putull(v);
+    }
+}
+
+static void calci_puts(const char *s){
+    calci_write(s, strlen(s));
+}
+
+/* Same output as printf("%lf"): fast path for finite values below 1e15 */
+static void calci_putr(double v){
+    unsigned long long ip, f, lo, hi, fp, rem;
+    double fr;
+    int i, exact;
+    /* Below 2^-12 the fraction has bits past the 0.64 fixed point */
+    if(!(v > -1e15 && v < 1e15) || (v != 0 && v > -0x1p-12 && v < 0x1p-12)){
+        calci_fmt("%lf", v);
+        return;
+    }
+    if(v < 0 || (v == 0 && 1.0 / v < 0)){
+        calci_lit("-");
+        v = -v;
+    }
+    /* Fraction as 0.64 fixed point, scaled by 10^6 exactly in two halves */
+    ip = (unsigned long long)v;
+    fr = (v - (double)ip) * 18446744073709551616.0;
+    f = (unsigned long long)fr;
+    exact = (double)f == fr;
+    lo = (f & 0xffffffffULL) * 1000000ULL;
+    hi = (f >> 32) * 1000000ULL + (lo >> 32);
+    fp = hi >> 32;
+    rem = (hi << 32) | (lo & 0xffffffffULL);
+    if(rem > 0x8000000000000000ULL || (rem == 0x8000000000000000ULL && (!exact || (fp & 1)))) fp++;
+    if(fp == 1000000){
+        fp = 0;
+        ip++;
+    }
+    calci_putull(ip);
+    if(CALCI_OBUFSZ - calci_opos < 7) calci_flush();
+    calci_obuf[calci_opos++] = '.';
+    for(i = 5; i >= 0; i--){
+        calci_obuf[calci_opos + i] = '0' + fp % 10;
+        fp /= 10;
+    }
+    calci_opos += 6;
+}
+"""
+
+INPUT: str = r"""#include <stdlib.h>
+#ifdef _WIN32
+#include <io.h>
+#define calci_read _read
+#else
+#include <unistd.h>
+#include <sys/stat.h>
+#include <sys/mman.h>
+#define calci_read read
+#endif
+
+#define CALCI_IBUFSZ 65536
+
+static char calci_ibufmem[CALCI_IBUFSZ];
+static char *calci_ibuf = calci_ibufmem;
+static size_t calci_ibufsz = CALCI_IBUFSZ;
+static const char *calci_ip = calci_ibufmem;
+static const char *calci_iend = calci_ibufmem;
+static int calci_ieof = 0;
+static int calci_imaptried = 0;
+
+static const double calci_pow10[] = {
+    1e0, 1e1, 1e2, 1e3, 1e4, 1e5, 1e6, 1e7, 1e8, 1e9, 1e10, 1e11,
+    1e12, 1e13, 1e14, 1e15, 1e16, 1e17, 1e18, 1e19, 1e20, 1e21, 1e22
+};
+
+/* Maps stdin when it is a regular file, reads it in blocks otherwise */
+static int calci_fill(void){
+    int n;
+    if(calci_ieof) return 0;
+#ifndef _WIN32
+    if(!calci_imaptried){
+        struct stat st;
+        off_t off;
+        void *p;
+        calci_imaptried = 1;
+        off = lseek(0, 0, SEEK_CUR);
+        if(off >= 0 && fstat(0, &st) == 0 && S_ISREG(st.st_mode) && st.st_size > off){
+            p = mmap(NULL, st.st_size, PROT_READ, MAP_PRIVATE, 0, 0);
+            if(p != MAP_FAILED){
+                calci_ip = (const char *)p + off;
+                calci_iend = (const char *)p + st.st_size;
+                calci_ieof = 1;
+                return 1;
+            }
+        }
+    }
+#endif
+    calci_flush();
+    n = calci_read(0, calci_ibuf, calci_ibufsz);
+    if(n <= 0){
+        calci_ieof = 1;
+        return 0;
+    }
+    calci_ip = calci_ibuf;
+    calci_iend = calci_ibuf + n;
+    return 1;
+}
+
+static int calci_peekc(void){
+    if(calci_ip == calci_iend && !calci_fill()) return -1;
+    return (unsigned char)*calci_ip;
+}
+
+#define calci_isspace(c) ((c) == ' ' || ((c) >= '\t' && (c) <= '\r'))
+
+static int calci_skipws(void){
+    int c;
+    while((c = calci_peekc()) != -1 && calci_isspace(c)) calci_ip++;
+    return c;
+}
+
+/* Length of the non-blank run at calci_ip, reading on until it is whole in the buffer */
+static size_t calci_token(void){
+    const char *p = calci_ip;
+    size_t have;
+    char *grown;
+    int n;
+    for(;;){
+        while(p < calci_iend && !calci_isspace(*p)) p++;
+        if(p < calci_iend || calci_ieof) return p - calci_ip;
+        have = calci_iend - calci_ip;
+        if(have == calci_ibufsz){
+            grown = malloc(calci_ibufsz * 2);
+            if(!grown) return have;
+            memcpy(grown, calci_ip, have);
+            if(calci_ibuf != calci_ibufmem) free(calci_ibuf);
+            calci_ibuf = grown;
+            calci_ibufsz *= 2;
+        }else{
+            memmove(calci_ibuf, calci_ip, have);
+        }
+        calci_flush();
+        n = calci_read(0, calci_ibuf + have, calci_ibufsz - have);
+        if(n <= 0){
+            n = 0;
+            calci_ieof = 1;
+        }
+        calci_ip = calci_ibuf;
+        calci_iend = calci_ibuf + have + n;
+        p = calci_iend - n;
+    }
+}
+
+/* scanf("%d") semantics: a failed conversion leaves the variable untouched */
+static int calci_scani(int *v){
+    unsigned int r = 0;
+    int c = calci_skipws(), neg = 0;
+    if(c == '-' || c == '+'){
+        neg = c == '-';
+        calci_ip++;
+        c = calci_peekc();
+    }
+    if(c < '0' || c > '9') return 0;
+    do{
+        r = r * 10 + (c - '0');
+        calci_ip++;
+    }while((c = calci_peekc()) >= '0' && c <= '9');
+    *v = (int)(neg ? 0u - r : r);
+    return 1;
+}
+
+static void calci_geti(int *v){
+    calci_scani(v);
+}
+
+static void calci_getu(unsigned int *v){
+    int t;
+    if(calci_scani(&t)) *v = (unsigned int)t;
+}
+
+/* scanf("%lf") semantics: plain decimals that convert exactly are read in
+   place, any other token goes to strtod whole */
+static void calci_getr(double *v){
+    const char *p, *end;
+    char *tok, *stop;
+    double r;
+    unsigned long long m = 0;
+    int digits = 0, frac = 0, ex = 0, exdigits = 0, exneg = 0, neg = 0;
+    size_t len;
+    if(calci_skipws() == -1) return;
+    len = calci_token();
+    p = calci_ip;
+    end = p + len;
+    if(p < end && (*p == '-' || *p == '+')) neg = *p++ == '-';
+    for(; p < end && *p >= '0' && *p <= '9'; p++, digits++) m = m * 10 + (*p - '0');
+    if(p < end && *p == '.'){
+        for(p++; p < end && *p >= '0' && *p <= '9'; p++, digits++, frac++) m = m * 10 + (*p - '0');
+    }
+    if(digits && p < end && (*p == 'e' || *p == 'E')){
+        p++;
+        if(p < end && (*p == '-' || *p == '+')) exneg = *p++ == '-';
+        for(; p < end && *p >= '0' && *p <= '9'; p++, exdigits++){
+            if(ex < 10000) ex = ex * 10 + (*p - '0');
+        }
+        if(!exdigits) p = calci_ip;       /* Left to strtod */
+    }
+    ex = (exneg ? -ex : ex) - frac;
+    if(p == end && digits && digits <= 15 && ex >= -22 && ex <= 22){
+        *v = ex < 0 ? (double)m / calci_pow10[-ex] : (double)m * calci_pow10[ex];
+        if(neg) *v = -*v;
+        calci_ip = end;
+        return;
+    }
+    tok = malloc(len + 1);
+    if(!tok) return;
+    memcpy(tok, calci_ip, len);
+    tok[len] = '\0';
+    r = strtod(tok, &stop);
+    if(stop != tok){
+        *v = r;
+        /* scanf also takes an e and its sign that no exponent digits follow */
+        if(*stop == 'e' || *stop == 'E'){
+            stop++;
+            if(*stop == '-' || *stop == '+') stop++;
+        }
+        calci_ip += stop - tok;
+    }
+    free(tok);
+}
+
+/* scanf("%[^\n]%*c") semantics, truncated to the size of a str variable */
+static void calci_gets(char *s){
+    int c = calci_peekc(), n = 0;
+    if(c == -1 || c == '\n') return;
+    while(c != -1 && c != '\n'){
+        if(n < 99) s[n++] = c;
+        calci_ip++;
+        c = calci_peekc();
+    }
+    s[n] = '\0';
+    if(c == '\n') calci_ip++;
+}
+"""
+
+RUNTIMES: dict = {
+    "output": OUTPUT,
+    "input": INPUT
+}
+
+# Runtime chunks that must be emitted before the given chunk
+REQUIRES: dict = {
+    "input": ["output"]
+}
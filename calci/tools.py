@@ -30,22 +30,52 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
-import os, shutil
+import os, shutil, subprocess, tempfile
+from functools import lru_cache
 from .errors import Error
 from .fileutils import dlfName
 
 def throwError(err: Error) -> Error:
     err.run()
 
+def getCC() -> str:
+    return os.getenv("CC", "tcc")
+
+# Compiler family of a $CC value: "gcc", "clang", "tcc" or the program name
+def ccFamily(cc: str) -> str:
+    name: str = os.path.basename(cc.split()[0]) if cc.strip() else ""
+    for family in ["clang", "gcc", "tcc"]:
+        if family in name:
+            return family
+    return name
+
+# Whether $CC can build and link an OpenMP program with -fopenmp
+@lru_cache(maxsize=None)
+def supportsOpenMP(cc: str) -> bool:
+    if ccFamily(cc) not in ["gcc", "clang"]:
+        return False
+    with tempfile.TemporaryDirectory() as tmpdir:
+        src: str = os.path.join(tmpdir, "omp.c")
+        with open(src, "w") as srcfile:
+            srcfile.write("#include <omp.h>\nint main(void){ return omp_get_max_threads() < 1; }\n")
+        result = subprocess.run(f"{cc} -fopenmp {src} -o {os.path.join(tmpdir, 'omp')}", shell=True,
+                                stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return result.returncode == 0
+
+# Extra compiler flags the generated C file needs
+def cFlags(cc: str, cfname: str) -> str:
+    with open(cfname) as cfile:
+        return " -fopenmp" if "#pragma omp" in cfile.read() and supportsOpenMP(cc) else ""
+
 def runProgram(fname: str, dlang: str) -> None:
     if dlang == "java":
         pass
     else:
-        cc: str = os.getenv("CC", "tcc")
+        cc: str = getCC()
         cfname: str = dlfName(fname, "c")
         exe: str = dlfName(fname)
         exe += ".exe" if os.name == 'nt' else ""
-        if os.system(f"{cc} {cfname} -o {exe}") != 0:
+        if os.system(f"{cc}{cFlags(cc, cfname)} {cfname} -o {exe}") != 0:
             os.remove(cfname)
             exit(-1)
 
@@ -72,10 +102,28 @@ def gencFmt(vtype: str, forfunc: str="_") -> str:
         "ireal": "%lf"
     }[forfunc+vtype]
 
+# A nat prints like printf("%d") does, as the int with the same bits
+def genPrintFn(vtype: str) -> str:
+    return {
+        "nat": "calci_puti",
+        "int": "calci_puti",
+        "real": "calci_putr",
+        "str": "calci_puts"
+    }[vtype]
+
+def genInputFn(vtype: str) -> str:
+    return {
+        "nat": "calci_getu",
+        "int": "calci_geti",
+        "real": "calci_getr",
+        "str": "calci_gets"
+    }[vtype]
+
 def getcType(vtype: str) -> str:
     return {
         "nat": "unsigned int",
         "int" : "int",
+        "long": "long long",
         "real" : "double",
         "str": "char[100]"
     }[vtype]
\ No newline at end of file
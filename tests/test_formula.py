@@ -0,0 +1,49 @@
+# Formula compiler check
+#
+#   python -m pytest tests/test_formula.py
+#
+# Compiles formulas with compile_formula and checks C-style integer division
+# and remainder, the compile cache and the errors it reports.
+import os, sys
+
+import pytest
+
+ROOT: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from calci import compile_formula, FormulaError
+
+def test_integer_division_truncates() -> None:
+    quotient = compile_formula("a / b", {"a": "int", "b": "int"})
+    remainder = compile_formula("a % b", {"a": "int", "b": "int"})
+    for a, b in [(7, 2), (-7, 2), (7, -2), (-7, -2), (6, -3), (0, 5)]:
+        assert quotient(a, b) == int(a / b)
+        assert remainder(a, b) == a - b * int(a / b)
+    assert compile_formula("a / b", {"a": "real", "b": "int"})(-7.0, 2) == -3.5
+
+def test_arguments_by_position_or_name() -> None:
+    formula = compile_formula(" a * b + c % 7 ", {"a": "int", "b": "nat", "c": "int"})
+    assert formula(2, 3, -9) == 4
+    assert formula(c=-9, b=3, a=2) == 4
+    assert formula.__doc__ == "a * b + c % 7"
+
+def test_compiles_are_cached() -> None:
+    types: dict = {"x": "int", "y": "real"}
+    first = compile_formula("x * y - 1", types)
+    assert compile_formula("x * y - 1", dict(types)) is first
+    assert compile_formula("  x * y - 1\t", types) is first
+    assert compile_formula("x * y - 1", {"x": "int", "y": "int"}) is not first
+
+@pytest.mark.parametrize("text, types", [
+    ("a + 1", {"a": "str"}),
+    ("a\n+ 1", {"a": "int"}),
+    ("a +", {"a": "int"}),
+    ("a b", {"a": "int"}),
+    ("x % y", {"x": "real", "y": "real"}),
+    ("z * 2", {}),
+    ("True + 1", {"True": "int"}),
+    ("None", {"None": "real"}),
+])
+def test_errors(text: str, types: dict) -> None:
+    with pytest.raises(FormulaError):
+        compile_formula(text, types)
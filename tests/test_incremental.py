@@ -0,0 +1,94 @@
+# Incremental front end check
+#
+#   python -m pytest tests/test_incremental.py
+#
+# Applies random edit sequences to the example programs, through edit() and
+# setText(), and checks after every edit that the C output and the
+# diagnostics are those of compiling the edited source afresh.
+import os, random, sys
+
+ROOT: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from calci.incremental import IncrementalCompiler
+
+SEQUENCES: int = 300
+EDITS: int = 10
+
+def examples() -> list:
+    folder: str = os.path.join(ROOT, "examples")
+    sources: list = []
+    for name in sorted(os.listdir(folder)):
+        if name.endswith(".ca"):
+            with open(os.path.join(folder, name)) as srcfile:
+                sources.append(srcfile.read().splitlines())
+    return sources
+
+def sourceText(lines: list) -> str:
+    return "".join(line + "\n" for line in lines)
+
+def checkSame(inc: IncrementalCompiler, lines: list, history: list) -> None:
+    fresh: IncrementalCompiler = IncrementalCompiler(sourceText(lines), "gcc")
+    context: str = "after edits " + repr(history) + " the source is\n" + sourceText(lines)
+    assert inc.diagnostics() == fresh.diagnostics(), context
+    assert inc.output() == fresh.output(), context
+
+def test_edits_match_fresh_compile() -> None:
+    rand: random.Random = random.Random(2022)
+    sources: list = examples()
+    pool: list = [line for source in sources for line in source]
+    for _ in range(SEQUENCES):
+        lines: list = list(rand.choice(sources))
+        inc: IncrementalCompiler = IncrementalCompiler(sourceText(lines), "gcc")
+        history: list = []
+        for _ in range(EDITS):
+            first: int = rand.randint(0, len(lines))
+            last: int = rand.randint(first, min(len(lines), first + 3))
+            new: list = rand.sample(pool, rand.randint(0, 2)) if rand.random() < 0.5 else []
+            lines[first:last] = new
+            history.append((first + 1, last, new))
+            if rand.random() < 0.5:
+                inc.edit(first + 1, last, sourceText(new))
+            else:
+                inc.setText(sourceText(lines))
+            checkSame(inc, lines, history)
+
+# An unfinished line before the IF, then edits on both sides of it
+def test_edits_around_error() -> None:
+    with open(os.path.join(ROOT, "examples", "numcomp.ca")) as srcfile:
+        lines: list = srcfile.read().splitlines()
+    inc: IncrementalCompiler = IncrementalCompiler(sourceText(lines), "gcc")
+    history: list = []
+    for first, last, new in [(11, 10, ["    var n1 :="]), (16, 16, []), (9, 9, ["end"]), (11, 11, [])]:
+        lines[first - 1:last] = new
+        history.append((first, last, new))
+        inc.edit(first, last, sourceText(new))
+        checkSame(inc, lines, history)
+
+# Inserting or deleting a statement between IFs reparses only that statement
+def test_edits_reparse_locally() -> None:
+    lines: list = ["nat a := 0", "input a"]
+    for block in range(200):
+        lines += [f"if a > {block} then", f"    print {block}", "end"]
+    inc: IncrementalCompiler = IncrementalCompiler(sourceText(lines), "gcc")
+    parseUnit = inc.parseUnit
+    calls: list = []
+    def countingParse(line: int, vars: dict, subs: dict):
+        calls.append(line)
+        return parseUnit(line, vars, subs)
+    inc.parseUnit = countingParse
+
+    history: list = []
+    for first, last, new in [(300, 299, ["var c := 1"]), (300, 300, []), (51, 53, [])]:
+        lines[first - 1:last] = new
+        history.append((first, last, new))
+        calls.clear()
+        inc.edit(first, last, sourceText(new))
+        assert len(calls) <= 2, history
+        checkSame(inc, lines, history)
+
+if __name__ == "__main__":
+    test_edits_match_fresh_compile()
+    test_edits_around_error()
+    test_edits_reparse_locally()
+    print("ok")
@@ -0,0 +1,40 @@
+# Compiled program check
+#
+#   CC=gcc python -m pytest tests/test_programs.py
+#
+# Builds every program in tests/programs, with and without partial
+# evaluation, runs it on <name>.in and compares what it prints with
+# <name>.out. Skipped when no C compiler is found.
+import os, shutil, subprocess, sys
+
+import pytest
+
+ROOT: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+PROGRAMS: str = os.path.join(os.path.dirname(os.path.abspath(__file__)), "programs")
+
+def compiler() -> str:
+    for cc in [os.getenv("CC"), "tcc", "gcc", "clang", "cc"]:
+        if cc and shutil.which(cc.split()[0]):
+            return cc
+    return None
+
+def readBytes(path: str) -> bytes:
+    if not os.path.exists(path):
+        return b""
+    with open(path, "rb") as datafile:
+        return datafile.read()
+
+@pytest.mark.parametrize("partial", [True, False])
+@pytest.mark.parametrize("name", sorted(name[:-3] for name in os.listdir(PROGRAMS) if name.endswith(".ca")))
+def test_program_output(name: str, partial: bool, tmp_path) -> None:
+    cc: str = compiler()
+    if cc is None:
+        pytest.skip("no C compiler")
+    source: str = str(tmp_path / (name + ".ca"))
+    shutil.copy(os.path.join(PROGRAMS, name + ".ca"), source)
+    flags: list = [] if partial else ["--no-partial"]
+    subprocess.run([sys.executable, os.path.join(ROOT, "calci.py")] + flags + [source], cwd=tmp_path,
+                   env=dict(os.environ, CC=cc), check=True)
+    result = subprocess.run([str(tmp_path / name)], input=readBytes(os.path.join(PROGRAMS, name + ".in")),
+                            capture_output=True, check=True)
+    assert result.stdout == readBytes(os.path.join(PROGRAMS, name + ".out"))